@@ -0,0 +1,365 @@
+"""Sinxronlash pipeline ini jonli akkauntlarsiz o'lchash (soxta TelegramClient bilan).
+
+Foydalanish:
+    python bench.py --targets 5 --messages 200 --rtt 0.05 --flood-rate 0.01 --fail-rate 0.01
+    python bench.py --scenarios edits --method-flood-rate edit_message=0.05 --method-fail-rate delete_messages=0.1
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+SOURCE_CHAT_ID = -1000000000001
+SCENARIOS = ('burst', 'replies', 'albums', 'edits', 'mass_delete', 'mixed', 'redelivery')
+
+
+class FakeMessage:
+    """Telethon Message o'rniga - bot ishlatadigan atributlargina"""
+
+    def __init__(self, message_id, text='', reply_to_msg_id=None, grouped_id=None):
+        self.id = message_id
+        self.message = text
+        self.text = text
+        self.reply_to_msg_id = reply_to_msg_id
+        self.grouped_id = grouped_id
+        self.date = datetime.now(timezone.utc)
+        self.edit_date = None
+        self.media = None
+        self.photo = None
+        self.document = None
+        self.entities = None
+        self.reply_markup = None
+        self.buttons = None
+        self.web_preview = None
+
+
+class FakeEntity:
+    def __init__(self, entity_id):
+        self.id = entity_id
+        self.title = f"Channel {entity_id}"
+        self.username = None
+
+
+class FakeEvent:
+    def __init__(self, chat_id, message=None, messages=None, deleted_ids=None):
+        self.chat_id = chat_id
+        self.message = message
+        self.messages = messages
+        self.id = message.id if message else None
+        self.grouped_id = messages[0].grouped_id if messages else None
+        self.deleted_id = deleted_ids
+
+
+class FakeTelegramClient:
+    """TelegramClient o'rniga: sozlanadigan RTT, FloodWait va xatolar, API chaqiruvlar hisobi"""
+
+    def __init__(self, rtt, jitter, flood_rate, flood_seconds, fail_rate, seed=0, flood_rates=None, fail_rates=None):
+        self.rtt = rtt
+        self.jitter = jitter
+        self.flood_rate = flood_rate
+        self.flood_seconds = flood_seconds
+        self.fail_rate = fail_rate
+        # Metod bo'yicha alohida ulushlar (masalan faqat send_message da FloodWait)
+        self.flood_rates = flood_rates or {}
+        self.fail_rates = fail_rates or {}
+        self.random = random.Random(seed)
+        self.calls = {}
+        self.source_messages = {}
+        self.next_ids = {}
+
+    async def _call(self, method, request=None):
+        from telethon.errors import FloodWaitError
+
+        self.calls[method] = self.calls.get(method, 0) + 1
+        await asyncio.sleep(max(self.rtt + self.random.uniform(-self.jitter, self.jitter), 0))
+        flood_rate = self.flood_rates.get(method, self.flood_rate)
+        fail_rate = self.fail_rates.get(method, self.fail_rate)
+        roll = self.random.random()
+        if roll < flood_rate:
+            raise FloodWaitError(request=request, capture=self.flood_seconds)
+        if roll < flood_rate + fail_rate:
+            raise RuntimeError(f"injected {method} failure")
+
+    def _new_message(self, entity):
+        self.next_ids[entity] = self.next_ids.get(entity, 0) + 1
+        return FakeMessage(self.next_ids[entity])
+
+    async def send_message(self, entity, message=None, **kwargs):
+        await self._call('send_message')
+        return self._new_message(entity)
+
+    async def send_file(self, entity, file=None, **kwargs):
+        await self._call('send_file')
+        return [self._new_message(entity) for _ in file]
+
+    async def edit_message(self, entity, message=None, **kwargs):
+        await self._call('edit_message')
+        return FakeMessage(message)
+
+    async def delete_messages(self, entity, message_ids=None, **kwargs):
+        await self._call('delete_messages')
+
+    async def get_entity(self, entity):
+        await self._call('get_entity')
+        if isinstance(entity, list):
+            return [FakeEntity(int(e)) for e in entity]
+        return FakeEntity(int(entity))
+
+    async def get_messages(self, entity, ids=None, **kwargs):
+        await self._call('get_messages')
+        if isinstance(ids, list):
+            return [self.source_messages.get(i) for i in ids]
+        return self.source_messages.get(ids)
+
+    async def get_permissions(self, entity, user=None):
+        await self._call('get_permissions')
+        return type('Permissions', (), {'is_creator': True, 'is_admin': True, 'post_messages': True})()
+
+
+def percentiles(values):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0, 0.0, 0.0
+    return tuple(ordered[min(int(q * len(ordered)), len(ordered) - 1)] for q in (0.5, 0.95, 0.99))
+
+
+def setup_environment(args):
+    """bot.py import qilinishidan oldin: joriy (vaqtinchalik) papkada benchmark sozlamalari"""
+    for key, value in {
+        'API_ID': '1', 'API_HASH': 'bench', 'BOT_TOKEN': 'bench', 'ADMIN_ID': '0',
+        'TARGET_RATE_PER_SEC': str(args.rate), 'TARGET_RATE_BURST': str(args.burst),
+        'FANOUT_CONCURRENCY': str(args.concurrency), 'JOB_WORKERS': str(args.workers),
+        'EDIT_DEBOUNCE_SECONDS': '0', 'JOB_RETRY_BASE_DELAY': '0.05', 'JOB_RETRY_MAX_DELAY': '1',
+        'SENDER_SESSIONS': '', 'METRICS_PORT': '0',
+        'PENDING_BUFFER_SIZE': str(args.pending_buffer), 'PENDING_BUFFER_POLICY': args.pending_policy,
+    }.items():
+        os.environ.setdefault(key, value)
+
+    targets = [-1000000001000 - i for i in range(args.targets)]
+    channels_data = {'routes': [{'source': SOURCE_CHAT_ID, 'targets': targets}]}
+    if args.footer:
+        # Barcha targetlarda bir xil qoida - natija har xabar uchun bir marta hisoblanadi
+        channels_data['transforms'] = {str(target): [{'type': 'footer', 'text': args.footer}] for target in targets}
+    with open('channels.json', 'w', encoding='utf-8') as f:
+        json.dump(channels_data, f)
+
+
+class Bench:
+    def __init__(self, bot, fake):
+        self.bot = bot
+        self.fake = fake
+        self.next_id = 0
+        self.latencies = []
+        self.started = 0.0
+        self.calls_before = {}
+
+        # Ish muvaffaqiyatli tugaganda navbatga qo'yilganidan beri o'tgan vaqt (fon ishlari hisoblanmaydi)
+        for kind, handler in list(bot.JOB_HANDLERS.items()):
+            bot.JOB_HANDLERS[kind] = self._timed(handler)
+
+    def _timed(self, handler):
+        async def run(job):
+            failed_targets = await handler(job)
+            if not failed_targets and job['priority'] < self.bot.PRIORITY_BACKGROUND:
+                self.latencies.append(time.time() - job['created_at'])
+            return failed_targets
+        return run
+
+    def new_message(self, **kwargs):
+        self.next_id += 1
+        message = FakeMessage(self.next_id, text=f"post {self.next_id}", **kwargs)
+        self.fake.source_messages[message.id] = message
+        return message
+
+    async def scenario_mixed(self, count):
+        """Og'ir fon ishi (backfill) davomida yangi postlar kechikishi"""
+        background = [self.new_message() for _ in range(count * 5)]
+        await self.bot.enqueue_backfill_batch(SOURCE_CHAT_ID, background, self.bot.channels_config.targets_by_chat[SOURCE_CHAT_ID])
+        events, _ = await self.post(count)
+        return events
+
+    async def scenario_redelivery(self, count):
+        """Reconnect dan keyin Telethon bir xil eventlarni qayta yuborganda (API chaqiruv bo'lmasligi kerak)"""
+        _, messages = await self.post(count)
+        await self.drain()
+        self.mark()
+        for message in messages:
+            await self.bot.handle_new_message(FakeEvent(SOURCE_CHAT_ID, message=message))
+        return count
+
+    def mark(self):
+        """O'lchov shu yerdan boshlanadi (tayyorlov postlari natijaga kirmaydi)"""
+        self.latencies.clear()
+        self.calls_before = dict(self.fake.calls)
+        self.started = time.monotonic()
+
+    async def drain(self):
+        while self.bot.job_queue.depth():
+            await asyncio.sleep(0.01)
+
+    async def post(self, count, reply_chain=False):
+        parent = None
+        messages = []
+        for _ in range(count):
+            message = self.new_message(reply_to_msg_id=parent.id if reply_chain and parent else None)
+            await self.bot.handle_new_message(FakeEvent(SOURCE_CHAT_ID, message=message))
+            messages.append(message)
+            parent = message
+        return count, messages
+
+    async def scenario_burst(self, count):
+        events, _ = await self.post(count)
+        return events
+
+    async def scenario_replies(self, count):
+        events, _ = await self.post(count, reply_chain=True)
+        return events
+
+    async def scenario_albums(self, count, album_size=5):
+        for _ in range(max(count // album_size, 1)):
+            grouped_id = self.next_id + 1
+            messages = [self.new_message(grouped_id=grouped_id) for _ in range(album_size)]
+            await self.bot.handle_album(FakeEvent(SOURCE_CHAT_ID, messages=messages))
+        return max(count // album_size, 1)
+
+    async def scenario_edits(self, count):
+        _, messages = await self.post(count)
+        await self.drain()
+        self.mark()
+        for message in messages:
+            edited = FakeMessage(message.id, text=message.text + ' (edited)')
+            edited.edit_date = datetime.now(timezone.utc)
+            self.fake.source_messages[message.id] = edited
+            await self.bot.handle_edited_message(FakeEvent(SOURCE_CHAT_ID, message=edited))
+        return count
+
+    async def scenario_mass_delete(self, count):
+        _, messages = await self.post(count)
+        await self.drain()
+        self.mark()
+        await self.bot.handle_deleted_message(FakeEvent(SOURCE_CHAT_ID, deleted_ids=[m.id for m in messages]))
+        return 1
+
+    async def run(self, scenario, count):
+        self.mark()
+        events = await getattr(self, f'scenario_{scenario}')(count)
+        await self.drain()
+        elapsed = time.monotonic() - self.started
+
+        calls = {method: n - self.calls_before.get(method, 0) for method, n in self.fake.calls.items()}
+        calls = {method: n for method, n in calls.items() if n}
+        return {
+            'scenario': scenario,
+            'events': events,
+            'seconds': elapsed,
+            'events_per_sec': events / elapsed if elapsed else 0.0,
+            'latency': percentiles(self.latencies),
+            'api_calls_per_event': sum(calls.values()) / events if events else 0.0,
+            'calls': calls,
+        }
+
+
+async def run_bench(args):
+    # Baza va JSON fayllar vaqtinchalik papkada - ishdan keyin o'chiriladi
+    cwd = os.getcwd()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory(prefix='postsentbot-bench-') as workdir:
+        os.chdir(workdir)
+        try:
+            setup_environment(args)
+            return await run_scenarios(args)
+        finally:
+            os.chdir(cwd)
+
+
+async def run_scenarios(args):
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log if not args.verbose else sys.stdout):
+        import bot
+
+        fake = FakeTelegramClient(
+            args.rtt, args.jitter, args.flood_rate, args.flood_seconds, args.fail_rate, args.seed,
+            flood_rates=dict(args.method_flood_rate), fail_rates=dict(args.method_fail_rate)
+        )
+        bot.client = fake
+        bot.bot = fake
+        bot.sender_pool.senders[bot.sender_pool.default_name] = fake
+
+        bench = Bench(bot, fake)
+        workers = [asyncio.create_task(bot.job_worker(i)) for i in range(args.workers)]
+        results = []
+        for scenario in args.scenarios:
+            results.append(await bench.run(scenario, args.messages))
+        for worker in workers:
+            worker.cancel()
+        bot.job_queue.close()
+        bot.message_store.close()
+
+    return results
+
+
+def print_report(results, args):
+    print(f"targets={args.targets} messages={args.messages} rtt={args.rtt * 1000:.0f}ms "
+          f"flood_rate={args.flood_rate} fail_rate={args.fail_rate} workers={args.workers}")
+    if args.method_flood_rate or args.method_fail_rate:
+        print(f"per-method flood_rate={dict(args.method_flood_rate)} fail_rate={dict(args.method_fail_rate)}")
+    print(f"{'scenario':<12} {'events':>7} {'ev/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'calls/ev':>9}")
+    for result in results:
+        p50, p95, p99 = result['latency']
+        print(f"{result['scenario']:<12} {result['events']:>7} {result['events_per_sec']:>8.1f} "
+              f"{p50 * 1000:>6.0f}ms {p95 * 1000:>6.0f}ms {p99 * 1000:>6.0f}ms {result['api_calls_per_event']:>9.2f}")
+    for result in results:
+        print(f"  {result['scenario']}: {result['calls']}")
+
+
+def method_rate(value):
+    """'send_message=0.05' -> ('send_message', 0.05)"""
+    method, _, rate = value.partition('=')
+    try:
+        return method, float(rate)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected METHOD=RATE, got {value!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark for the sync pipeline")
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--messages', type=int, default=100, help="source events per scenario")
+    parser.add_argument('--targets', type=int, default=5)
+    parser.add_argument('--rtt', type=float, default=0.05, help="fake API round trip, seconds")
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--flood-rate', type=float, default=0.0, help="share of calls raising FloodWaitError")
+    parser.add_argument('--flood-seconds', type=int, default=1)
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="share of calls raising a generic error")
+    parser.add_argument('--method-flood-rate', type=method_rate, action='append', default=[], metavar='METHOD=RATE',
+                        help="override --flood-rate for one method (send_message, edit_message, delete_messages, get_entity...)")
+    parser.add_argument('--method-fail-rate', type=method_rate, action='append', default=[], metavar='METHOD=RATE',
+                        help="override --fail-rate for one method")
+    parser.add_argument('--rate', type=float, default=1000, help="TARGET_RATE_PER_SEC during the run")
+    parser.add_argument('--burst', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--pending-buffer', type=int, default=1000, help="PENDING_BUFFER_SIZE during the run")
+    parser.add_argument('--pending-policy', choices=('spill', 'block'), default='spill')
+    parser.add_argument('--footer', help="apply a footer transform rule (HTML) to every target")
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    parser.add_argument('--verbose', action='store_true', help="show bot log output")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_bench(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,55 @@
 import asyncio
+import contextlib
+import hashlib
 import json
 import os
+import time
+import weakref
+from datetime import datetime, timezone
 from telethon import TelegramClient, events
-from telethon.tl.types import MessageMediaPhoto, MessageMediaDocument, MessageMediaWebPage, MessageMediaContact, MessageMediaGeo, MessageMediaVenue, MessageMediaGame, MessageMediaInvoice, MessageMediaPoll, MessageMediaDice, MessageMediaStory
+from telethon.errors import FloodWaitError, MessageNotModifiedError
+from telethon.extensions import html
+from telethon.helpers import add_surrogate, del_surrogate
+from telethon.tl.types import (
+    MessageEntityBotCommand, MessageEntityCashtag, MessageEntityEmail, MessageEntityHashtag, MessageEntityMention,
+    MessageEntityPhone, MessageEntityTextUrl, MessageEntityUrl, MessageMediaDocument, MessageMediaPhoto,
+    MessageMediaWebPage
+)
 
 # Load configuration from config.py
 try:
     from config import API_ID, API_HASH, BOT_TOKEN
+    from config import FANOUT_CONCURRENCY, TARGET_RATE_PER_SEC, TARGET_RATE_BURST
+    from config import REPLY_WAIT_TIMEOUT
+    from config import BACKFILL_BATCH_SIZE, BACKFILL_WAIT_TIME, BACKFILL_MAX_QUEUE_DEPTH, BACKFILL_DEFAULT_LIMIT, BACKFILL_MAX_LIMIT
+    from config import DELETE_CHUNK_SIZE, EDIT_DEBOUNCE_SECONDS
+    from config import ENTITY_CACHE_TTL, ENTITY_CACHE_MAX_SIZE
+    from config import SENDER_SESSIONS
+    from config import METRICS_HOST, METRICS_PORT
+    from config import RESYNC_MAX_LIMIT
+    from config import DEDUP_INDEX_SIZE
+    from config import PENDING_BUFFER_SIZE, PENDING_BUFFER_POLICY
+    from config import MAPPING_RETENTION_DAYS, MAPPING_MAX_POSTS, MAPPING_ARCHIVE_FILE, RETENTION_INTERVAL
+    from config import JOB_WORKERS, JOB_MAX_ATTEMPTS, JOB_RETRY_BASE_DELAY, JOB_RETRY_MAX_DELAY, JOB_RETENTION
 except ImportError:
     print("Error: config.py not found or missing API_ID, API_HASH, BOT_TOKEN.")
     exit(1)
 
+from dedup import DedupIndex
+from entity_cache import EntityCache
+from fanout import FanoutEngine, current_priority
+from job_queue import JobQueue, PRIORITY_BACKGROUND
+from metrics import Metrics
+from pending import PendingBuffer
+from senders import SenderPool
+from storage import MessageStore
+from transforms import Transformer
+
 # File paths for storing channel and message mappings
 CHANNELS_FILE = 'channels.json'
-MESSAGE_MAP_FILE = 'message_map.json'
+MESSAGE_MAP_FILE = 'message_map.json'  # eski format, faqat bir martalik import uchun
+MESSAGE_DB_FILE = 'message_map.db'
+ENTITY_CACHE_FILE = 'entity_cache.json'
 
 # Initialize TelegramClient for user session (for full API access)
 client = TelegramClient('user_session', API_ID, API_HASH)
@@ -22,8 +58,28 @@ client = TelegramClient('user_session', API_ID, API_HASH)
 bot = TelegramClient('bot_session', API_ID, API_HASH)
 
 # Global variables for message processing
-message_processing_lock = asyncio.Lock()
-pending_messages = {}  # Store messages waiting for reply resolution
+message_locks = weakref.WeakValueDictionary()  # (chat_id, message_id) -> asyncio.Lock, ishlatilmasa o'chadi
+inflight = {}  # single-flight: kalit -> bajarilayotgan task
+# Qayta kelgan eventlar (reconnect dan keyin) navbatga yetmasdan tashlanadi
+event_dedup = DedupIndex(DEDUP_INDEX_SIZE)
+bot_ready = asyncio.Event()  # clientlar ishga tushib, entitylar yuklangach o'rnatiladi
+# idempotency key -> jonli eventdan kelgan xabarlarning ixcham nusxalari (hajmi cheklangan)
+pending_buffer = PendingBuffer(PENDING_BUFFER_SIZE, PENDING_BUFFER_POLICY)
+
+# Kanal entity keshi (ikkala client uchun umumiy, restart dan keyin ham saqlanadi)
+entity_cache = EntityCache(ENTITY_CACHE_FILE, ENTITY_CACHE_TTL, ENTITY_CACHE_MAX_SIZE)
+
+# Bosqichlar bo'yicha kechikish va targetlar bo'yicha hisoblagichlar (/stats va /metrics)
+metrics = Metrics()
+
+# Target kanallarga parallel, rate-limited yuborish
+fanout = FanoutEngine(FANOUT_CONCURRENCY, TARGET_RATE_PER_SEC, TARGET_RATE_BURST, metrics=metrics)
+
+# Yuborish uchun qo'shimcha user sessiyalar (asosiy sessiya har doim pool da)
+sender_pool = SenderPool(
+    {'user_session': client, **{name: TelegramClient(name, API_ID, API_HASH) for name in SENDER_SESSIONS}},
+    default_name='user_session'
+)
 
 # --- Helper Functions ---
 
@@ -31,35 +87,162 @@ def load_channels():
     if os.path.exists(CHANNELS_FILE):
         with open(CHANNELS_FILE, 'r', encoding='utf-8') as f:
             return json.load(f)
-    return {'source_channel': None, 'target_channels': []}
+    return {'routes': []}
 
 def save_channels(channels_data):
-    with open(CHANNELS_FILE, 'w', encoding='utf-8') as f:
+    # Avval vaqtinchalik faylga yozib, keyin almashtirish - yarim yozilgan fayl qolmaydi
+    tmp_file = CHANNELS_FILE + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
         json.dump(channels_data, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_file, CHANNELS_FILE)
 
-def load_message_map():
-    if os.path.exists(MESSAGE_MAP_FILE):
-        with open(MESSAGE_MAP_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
+def normalize_chat_id(channel_id):
+    """JSON dagi musbat ID ni Telethon ishlatadigan -100... formatga o'tkazish"""
+    if isinstance(channel_id, int) and channel_id > 0:
+        return int(f"-100{channel_id}")
+    return channel_id
 
-def save_message_map(message_map_data):
-    with open(MESSAGE_MAP_FILE, 'w', encoding='utf-8') as f:
-        json.dump(message_map_data, f, ensure_ascii=False, indent=4)
+class ChannelsConfig:
+    """Marshrutlar jadvali (manba -> maqsad kanallar) - bir marta yuklanadi va xotirada saqlanadi"""
 
-async def get_channel_name(channel_id):
-    """Kanal nomini olish funksiyasi"""
-    try:
-        entity = await client.get_entity(channel_id)
-        if hasattr(entity, 'title') and entity.title:
-            return entity.title
-        elif hasattr(entity, 'username') and entity.username:
-            return f"@{entity.username}"
+    def __init__(self, channels_data):
+        routes = channels_data.get('routes')
+        if routes is None:
+            # Eski format: bitta source_channel + target_channels
+            routes = []
+            if channels_data.get('source_channel') is not None or channels_data.get('target_channels'):
+                routes.append({
+                    'source': channels_data.get('source_channel'),
+                    'targets': channels_data.get('target_channels', [])
+                })
+        self.routes = tuple(
+            {'source': route.get('source'), 'targets': tuple(route.get('targets', []))}
+            for route in routes
+        )
+
+        # chat_id -> maqsad kanallar: event handlerlar bitta dict lookup bilan yo'naltiradi.
+        # Bir manba bir nechta marshrutda bo'lsa, targetlar birlashtiriladi (many-to-many)
+        targets_by_chat = {}
+        for route in self.routes:
+            if route['source'] is None:
+                continue
+            chat_targets = targets_by_chat.setdefault(normalize_chat_id(route['source']), [])
+            for target in route['targets']:
+                if target not in chat_targets:
+                    chat_targets.append(target)
+        self.targets_by_chat = {chat_id: tuple(targets) for chat_id, targets in targets_by_chat.items() if targets}
+
+        # Har bir target uchun matn qoidalari - shu yerda bir marta kompilyatsiya qilinadi
+        self.transformer = Transformer(channels_data.get('transforms'))
+
+    @property
+    def default_route(self):
+        """/set_source, /add_target, /remove_target boshqaradigan birinchi marshrut"""
+        return self.routes[0] if self.routes else {'source': None, 'targets': ()}
+
+    @property
+    def source_channel(self):
+        return self.default_route['source']
+
+    @property
+    def target_channels(self):
+        return self.default_route['targets']
+
+    @property
+    def source_chat_id(self):
+        return normalize_chat_id(self.source_channel)
+
+    @property
+    def is_active(self):
+        return bool(self.targets_by_chat)
+
+    def to_dict(self):
+        channels_data = {
+            'routes': [
+                {'source': route['source'], 'targets': list(route['targets'])}
+                for route in self.routes
+            ]
+        }
+        if self.transformer.rules_by_target:
+            channels_data['transforms'] = self.transformer.rules_by_target
+        return channels_data
+
+def update_routes(routes):
+    """Sozlamani yangilash: avval diskka yoziladi, keyin xotiradagi obyekt almashtiriladi"""
+    global channels_config
+    new_config = ChannelsConfig({'routes': routes, 'transforms': channels_config.transformer.rules_by_target})
+    save_channels(new_config.to_dict())
+    channels_config = new_config
+    return new_config
+
+def update_default_route(**changes):
+    routes = channels_config.to_dict()['routes']
+    if not routes:
+        routes.append({'source': None, 'targets': []})
+    routes[0].update(changes)
+    return update_routes(routes)
+
+# Process-wide routing config (startup da bir marta yuklanadi)
+channels_config = ChannelsConfig(load_channels())
+
+# Message mapping store (SQLite, WAL). Eski bazadagi mappinglar birinchi marshrut manbasiga tegishli
+message_store = MessageStore(
+    MESSAGE_DB_FILE,
+    legacy_chat_id=channels_config.source_chat_id,
+    archive_path=MAPPING_ARCHIVE_FILE or None
+)
+
+# Doimiy ish navbati (o'sha bazada, restart dan keyin davom etadi)
+job_queue = JobQueue(MESSAGE_DB_FILE, background_slots=max(JOB_WORKERS - 1, 1))
+metrics.gauge('queue_depth', job_queue.depth)
+metrics.gauge('ready', lambda: int(bot_ready.is_set()))
+metrics.gauge('dedup_index_size', lambda: len(event_dedup))
+metrics.gauge('pending_buffer_size', lambda: len(pending_buffer))
+metrics.gauge('pending_buffer_spilled', lambda: pending_buffer.spilled)
+metrics.gauge('pending_buffer_waiting', lambda: pending_buffer.waiting)
+
+def entity_display_name(entry, channel_id):
+    if entry and entry.get('title'):
+        return entry['title']
+    elif entry and entry.get('username'):
+        return f"@{entry['username']}"
+    return f"ID: {channel_id}"
+
+async def resolve_entities(keys):
+    """Bir nechta kanalni keshdan, keshda yo'qlarini esa bitta batched get_entity bilan olish"""
+    resolved = {}
+    missing = []
+    for key in keys:
+        entry = entity_cache.get(key)
+        if entry:
+            resolved[key] = entry
         else:
-            return f"ID: {channel_id}"
+            missing.append(key)
+    if not missing:
+        return resolved
+
+    try:
+        entities = await client.get_entity(missing)
+        for key, entity in zip(missing, entities):
+            resolved[key] = entity_cache.put(key, entity)
     except Exception as e:
-        print(f"Error getting channel name for {channel_id}: {e}")
-        return f"ID: {channel_id}"
+        # Batch ichida bitta xato bo'lsa - qolganlarini alohida, ikkala client orqali urinib ko'rish
+        print(f"Batched entity resolution failed ({e}), resolving one by one")
+        for key in missing:
+            for tg_client in (client, bot):
+                try:
+                    resolved[key] = entity_cache.put(key, await tg_client.get_entity(key))
+                    break
+                except Exception as e:
+                    print(f"Error getting entity for {key}: {e}")
+
+    entity_cache.save()
+    return resolved
+
+async def get_channel_name(channel_id):
+    """Kanal nomini olish funksiyasi"""
+    entry = (await resolve_entities([channel_id])).get(channel_id)
+    return entity_display_name(entry, channel_id)
 
 async def get_entity_id(entity_str):
     """Entity ID ni olish funksiyasi"""
@@ -71,19 +254,18 @@ async def get_entity_id(entity_str):
             return -100000000000000 - entity_id  # Proper supergroup/channel ID conversion
         return entity_id
     except ValueError:
-        # If not a numeric string, try to resolve by username/link
-        try:
-            entity = await client.get_entity(entity_str)
-            return entity.id
-        except Exception as e:
-            print(f"Entity resolution error: {e}")
+        # If not a numeric string, try to resolve by username/link (keshdan)
+        entry = (await resolve_entities([entity_str])).get(entity_str)
+        if entry is None:
+            print(f"Entity resolution error: {entity_str} not found")
             return None
+        return entry['id']
 
 async def get_media_for_forward(message):
     """Media faylni to'g'ri formatda qaytarish"""
     if not message.media:
         return None
-    
+
     try:
         # Photo uchun
         if isinstance(message.media, MessageMediaPhoto):
@@ -111,85 +293,787 @@ async def get_media_for_forward(message):
         print(f"Error getting media: {e}")
         return None
 
-async def wait_for_reply_mapping(reply_to_msg_id, max_wait_time=10):
-    """Reply xabar uchun mapping kutish funksiyasi"""
-    wait_time = 0
-    while wait_time < max_wait_time:
-        message_map_data = load_message_map()
-        if str(reply_to_msg_id) in message_map_data:
-            return message_map_data[str(reply_to_msg_id)]
-        await asyncio.sleep(0.5)
-        wait_time += 0.5
-    return None
-
-async def process_pending_messages():
-    """Kutilayotgan xabarlarni qayta ishlash"""
-    global pending_messages
-    
-    if not pending_messages:
-        return
-    
-    print(f"Processing {len(pending_messages)} pending messages...")
-    
-    # Pending messages ni copy qilib, originalini tozalash
-    messages_to_process = pending_messages.copy()
-    pending_messages.clear()
+def message_fingerprint(message, variant=None):
+    """Xabar tarkibi fingerprint i: matn+entitylar, media ID va tugmalar alohida hash qilinadi.
+
+    variant berilsa - target qoidalari qo'llangan matn bo'yicha (resync target nusxasini shu bilan solishtiradi)
+    """
+    def digest(value):
+        return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+    text = variant.text if variant else message.message
+    entities = [entity.to_dict() for entity in ((variant.entities if variant else message.entities) or [])]
+    media = message.photo or message.document
+    reply_markup = message.reply_markup.to_dict() if message.reply_markup else None
+    return json.dumps({
+        'text': digest([text or '', entities]),
+        'media': str(media.id) if media else None,
+        'buttons': digest(reply_markup) if reply_markup else None
+    }, sort_keys=True)
+
+def target_variant(message, target_id, content_key=None):
+    """Target qoidalari qo'llangan natija (qoidasiz target uchun None). Bir xil qoidalar uchun bir marta hisoblanadi"""
+    ruleset = channels_config.transformer.for_target(target_id)
+    if ruleset is None:
+        return None
+    return channels_config.transformer.render(ruleset, message, content_key or message_fingerprint(message))
+
+def target_text(message, target_id, content_key=None):
+    """Target ga yuboriladigan matn (parse_mode='html'). Qoidasiz target ham qoidali bilan bir xil formatda"""
+    variant = target_variant(message, target_id, content_key)
+    return html.unparse(message.message, message.entities) if variant is None else variant.html
+
+def message_lock(chat_id, message_id):
+    lock = message_locks.get((chat_id, message_id))
+    if lock is None:
+        lock = message_locks[(chat_id, message_id)] = asyncio.Lock()
+    return lock
+
+@contextlib.asynccontextmanager
+async def source_message_locks(chat_id, message_ids):
+    """Bitta manba xabar ustidagi forward/edit/delete ketma-ket; boshqa xabarlar bir-birini kutmaydi"""
+    async with contextlib.AsyncExitStack() as stack:
+        # Doim o'sish tartibida olinadi - deadlock bo'lmaydi
+        for message_id in sorted({int(message_id) for message_id in message_ids}):
+            await stack.enter_async_context(message_lock(chat_id, message_id))
+        yield
+
+async def get_sender_media(sender, chat_id, messages, files):
+    """Media havolalari (file_reference, access_hash) sessiyaga bog'liq - boshqa sessiya xabarni o'zi o'qiydi"""
+    if sender == sender_pool.default_name or not any(files):
+        return files
+    own_messages = await sender_pool.get_client(sender).get_messages(chat_id, ids=[m.id for m in messages])
+    return [await get_media_for_forward(m) if m else None for m in own_messages]
+
+async def forward_message_with_reply(chat_id, message, target_channel_ids, reply_mapping=None):
+    """Xabarni reply bilan forward qilish. Yuborilmay qolgan targetlar ro'yxatini qaytaradi"""
+    original_message_id = message.id
+    forwarded_message_ids = {}
+    reply_mapping = reply_mapping or {}
+
+    # Allaqachon yuborilgan targetlarga qayta yubormaslik (retry va restart uchun idempotentlik)
+    existing_mapping = message_store.get_mapping(chat_id, original_message_id)
+    target_channel_ids = [t for t in target_channel_ids if str(t) not in existing_mapping]
+    if not target_channel_ids:
+        return []
+
+    # Media va fingerprint barcha targetlar uchun bir marta aniqlanadi
+    media = await get_media_for_forward(message)
+    fingerprint = message_fingerprint(message)
+    sent_by = {}
+
+    async def send_to_target(target_id, sender):
+        sender_media = (await get_sender_media(sender, chat_id, [message], [media]))[0]
+        result = await sender_pool.get_client(sender).send_message(
+            entity=target_id,
+            message=target_text(message, target_id, fingerprint),
+            file=sender_media,
+            reply_to=reply_mapping.get(str(target_id)),
+            link_preview=message.web_preview if hasattr(message, 'web_preview') else None,
+            buttons=message.buttons if hasattr(message, 'buttons') else None,
+            parse_mode='html'
+        )
+        sent_by[str(target_id)] = sender
+        return result
+
+    # Barcha targetlarga parallel yuborish (har target uchun eng kam yuklangan sessiya)
+    failed_targets = []
+    results = await fanout.run(target_channel_ids, send_to_target, sender_pool)
+    for target_id, result in results.items():
+        if isinstance(result, BaseException):
+            print(f"Error forwarding message {original_message_id} to {target_id}: {result}")
+            failed_targets.append(target_id)
+            continue
+        forwarded_message_ids[str(target_id)] = result.id
+        print(f"Forwarded message {original_message_id} to {target_id} as {result.id}")
     
-    for msg_id, msg_data in messages_to_process.items():
-        try:
-            await forward_message_with_reply(
-                msg_data['event'],
-                msg_data['target_channel_ids'],
-                msg_data['reply_to_msg_id']
+    # Mapping ni saqlash (bitta tranzaksiya, butun faylni qayta yozmasdan)
+    if forwarded_message_ids:
+        with metrics.timer('store_commit'):
+            message_store.set_mapping(
+                chat_id, original_message_id, forwarded_message_ids, fingerprint, sent_by
+            )
+        # Bu xabarga reply qilib navbatda kutayotgan ishlar bo'lsa - darhol davom ettirish
+        job_queue.wake()
+
+    return failed_targets
+
+async def forward_album(chat_id, messages, target_channel_ids, reply_mapping=None):
+    """Albomni (grouped_id) har bir targetga bitta send_file bilan yuborish"""
+    messages = sorted(messages, key=lambda m: m.id)
+    original_ids = [m.id for m in messages]
+    reply_mapping = reply_mapping or {}
+
+    # Albom bitta send_file da ketadi - birinchi element yuborilgan targetlar tayyor hisoblanadi
+    existing_mapping = message_store.get_mapping(chat_id, original_ids[0])
+    target_channel_ids = [t for t in target_channel_ids if str(t) not in existing_mapping]
+    if not target_channel_ids:
+        return []
+
+    files = [await get_media_for_forward(m) for m in messages]
+    fingerprints = {m.id: message_fingerprint(m) for m in messages}
+    sent_by = {}
+
+    async def send_album_to_target(target_id, sender):
+        result = await sender_pool.get_client(sender).send_file(
+            target_id,
+            file=await get_sender_media(sender, chat_id, messages, files),
+            caption=[target_text(m, target_id, fingerprints[m.id]) or '' for m in messages],
+            reply_to=reply_mapping.get(str(target_id)),
+            parse_mode='html'
+        )
+        sent_by[str(target_id)] = sender
+        return result
+
+    # Har bir target uchun bitta API chaqiruv (10 ta alohida send_message o'rniga)
+    failed_targets = []
+    results = await fanout.run(target_channel_ids, send_album_to_target, sender_pool)
+    album_mappings = {original_id: {} for original_id in original_ids}
+    for target_id, result in results.items():
+        if isinstance(result, BaseException):
+            print(f"Error forwarding album {original_ids} to {target_id}: {result}")
+            failed_targets.append(target_id)
+            continue
+        # Har bir albom elementi o'z mapping iga ega - alohida tahrirlash/o'chirish ishlaydi
+        for original_id, forwarded_message in zip(original_ids, result):
+            album_mappings[original_id][str(target_id)] = forwarded_message.id
+        print(f"Forwarded album {original_ids} to {target_id} as {[m.id for m in result]}")
+
+    album_mappings = {k: v for k, v in album_mappings.items() if v}
+    if album_mappings:
+        with metrics.timer('store_commit'):
+            message_store.set_mappings(
+                chat_id, album_mappings, fingerprints, sent_by
             )
+        job_queue.wake()
+
+    return failed_targets
+
+async def edit_forwarded_message(chat_id, message):
+    """Target kanallardagi nusxalarni tahrirlash. Tahrirlanmay qolgan targetlarni qaytaradi"""
+    async with source_message_locks(chat_id, [message.id]):
+        original_message_id = message.id
+        forwarded_ids_map = message_store.get_mapping(chat_id, original_message_id)
+        if not forwarded_ids_map:
+            return []
+
+        # Saqlangan fingerprint bilan solishtirib, faqat o'zgargan qismlar yuboriladi
+        new_fingerprint = message_fingerprint(message)
+        new_parts = json.loads(new_fingerprint)
+        old_fingerprints = message_store.get_fingerprints(chat_id, original_message_id)
+        # Nusxa qaysi sessiyadan yuborilgan bo'lsa - o'sha sessiya tahrirlaydi
+        sessions = message_store.get_sessions(chat_id, original_message_id)
+        media = await get_media_for_forward(message)
+
+        async def edit_in_target(target_id):
+            forwarded_msg_id = forwarded_ids_map[str(target_id)]
+            old_fingerprint = old_fingerprints.get(str(target_id))
+            if old_fingerprint == new_fingerprint:
+                return False
+            sender = sessions.get(str(target_id)) or sender_pool.default_name
+            sender_client = sender_pool.get_client(sender)
+            # Forward dagi bilan bir xil natija (kesh) - qoidalar qayta ishlamaydi
+            text = target_text(message, target_id, new_fingerprint)
+            old_parts = json.loads(old_fingerprint) if old_fingerprint else {}
+
+            if old_parts and old_parts.get('media') == new_parts['media']:
+                # Media o'zgarmagan - faqat matn/tugmalar tahrirlanadi, media qayta yuborilmaydi
+                await sender_client.edit_message(
+                    entity=target_id,
+                    message=forwarded_msg_id,
+                    text=text,
+                    link_preview=message.web_preview if hasattr(message, 'web_preview') else None,
+                    buttons=message.buttons if hasattr(message, 'buttons') else None,
+                    parse_mode='html'
+                )
+                print(f"Edited text of forwarded message {forwarded_msg_id} in {target_id} for original {original_message_id}")
+                return True
+
+            try:
+                # Avval media + caption tahrirlashga harakat qilish
+                await sender_client.edit_message(
+                    entity=target_id,
+                    message=forwarded_msg_id,
+                    text=text,
+                    file=(await get_sender_media(sender, chat_id, [message], [media]))[0],
+                    link_preview=message.web_preview if hasattr(message, 'web_preview') else None,
+                    buttons=message.buttons if hasattr(message, 'buttons') else None,
+                    parse_mode='html'
+                )
+                print(f"Edited forwarded message {forwarded_msg_id} in {target_id} for original {original_message_id}")
+            except (FloodWaitError, MessageNotModifiedError):
+                raise
+            except Exception as e:
+                print(f"Error editing message {forwarded_msg_id} in {target_id}: {e}")
+                # Fallback: Faqat caption tahrirlash
+                await sender_client.edit_message(
+                    entity=target_id,
+                    message=forwarded_msg_id,
+                    text=text,
+                    parse_mode='html'
+                )
+                print(f"Fallback: Edited caption only for message {forwarded_msg_id}")
+            return True
+
+        # Har bir target kanal uchun parallel tahrirlash
+        failed_targets = []
+        updated_fingerprints = {}
+        target_ids = [int(target_id_str) for target_id_str in forwarded_ids_map]
+        results = await fanout.run(target_ids, edit_in_target)
+        for target_id, result in results.items():
+            # Retry da o'zgarish yo'q bo'lsa - bu xato emas
+            if isinstance(result, BaseException) and not isinstance(result, MessageNotModifiedError):
+                print(f"Failed to edit message {forwarded_ids_map[str(target_id)]} in {target_id}: {result}")
+                failed_targets.append(target_id)
+            elif result is not False:
+                updated_fingerprints[target_id] = new_fingerprint
+
+        if updated_fingerprints:
+            message_store.set_fingerprints(chat_id, original_message_id, updated_fingerprints)
+        elif not failed_targets:
+            print(f"Edit of {original_message_id} changed nothing, skipped")
+        return failed_targets
+
+async def delete_forwarded_messages(chat_id, deleted_ids):
+    """O'chirilgan original xabarlarning nusxalarini targetlardan o'chirish"""
+    async with source_message_locks(chat_id, deleted_ids):
+        # Hali yuborilmagan (retry/reply kutayotgan) nusxalar o'chirilgan postni qayta chiqarmasin
+        for key in job_queue.cancel_source_jobs(chat_id, deleted_ids):
+            pending_buffer.pop(key)
+        # O'chirilgan postga reply qilganlar endi kutmaydi
+        for original_message_id in deleted_ids:
+            job_queue.release_dependents(chat_id, original_message_id)
+
+        # Barcha mappinglar bitta so'rovda olinadi va target, keyin sessiya bo'yicha guruhlanadi
+        rows = message_store.get_mapping_rows(chat_id, deleted_ids)
+        found_ids = {original_message_id for original_message_id, _, _, _ in rows}
+        for original_message_id in deleted_ids:
+            if int(original_message_id) not in found_ids:
+                print(f"No mapping found for deleted message {original_message_id}")
+        if not rows:
+            return []
+
+        forwarded_by_target = {}
+        for original_message_id, target_id, forwarded_msg_id, sender in rows:
+            forwarded_by_target.setdefault(target_id, {}).setdefault(sender, []).append(
+                (original_message_id, forwarded_msg_id)
+            )
+
+        deleted_pairs = []
+
+        async def delete_in_target(target_id):
+            first_chunk = True
+            for sender, items in forwarded_by_target[target_id].items():
+                # Har bir target uchun 100 tadan bitta delete_messages chaqiruv, nusxani yuborgan sessiya orqali
+                for i in range(0, len(items), DELETE_CHUNK_SIZE):
+                    chunk = items[i:i + DELETE_CHUNK_SIZE]
+                    if not first_chunk:
+                        await fanout.bucket(target_id).acquire()
+                    first_chunk = False
+                    await sender_pool.get_client(sender).delete_messages(
+                        entity=target_id, message_ids=[fwd for _, fwd in chunk]
+                    )
+                    deleted_pairs.extend((original_message_id, target_id) for original_message_id, _ in chunk)
+                    print(f"Deleted {len(chunk)} forwarded messages in {target_id}")
+
+        failed_targets = []
+        results = await fanout.run(forwarded_by_target, delete_in_target)
+        for target_id, result in results.items():
+            if isinstance(result, BaseException):
+                print(f"Error deleting messages in {target_id}: {result}")
+                failed_targets.append(target_id)
+
+        # Faqat muvaffaqiyatli o'chirilgan mappinglar olib tashlanadi (bitta tranzaksiya) - retry qolganini qiladi
+        if deleted_pairs:
+            message_store.delete_forwarded_ids(chat_id, deleted_pairs)
+            print(f"Removed {len(deleted_pairs)} message mappings for {len(found_ids)} deleted messages")
+
+        return failed_targets
+
+def is_duplicate_event(chat_id, key, kind, version=None):
+    """(chat_id, message id, event turi, versiya) avval ko'rilgan bo'lsa - API chaqiruvsiz tashlanadi"""
+    if event_dedup.seen((chat_id, key, kind, version)):
+        metrics.inc('duplicate_events', kind=kind)
+        return True
+    return False
+
+async def single_flight(key, func, *args):
+    """Bir xil ish parallel ikki marta bajarilmaydi - ikkinchi chaqiruvchi birinchisining natijasini kutadi"""
+    task = inflight.get(key)
+    if task is None:
+        task = inflight[key] = asyncio.ensure_future(func(*args))
+        task.add_done_callback(lambda _: inflight.pop(key, None))
+    return await asyncio.shield(task)
+
+# --- Job Queue ---
+
+def enqueue_job(kind, idempotency_key, chat_id, message_ids, messages=None, reply_to=None, priority=None, **payload):
+    """Ishni doimiy navbatga qo'shish. Takroriy kalit bo'lsa hech narsa qilinmaydi"""
+    payload.update(chat_id=chat_id, message_ids=list(message_ids))
+
+    # Parent mapping allaqachon bo'lsa kutish shart emas
+    if reply_to and message_store.has_mapping(chat_id, reply_to):
+        reply_to = None
+
+    added = job_queue.put(
+        kind, payload, idempotency_key, reply_to=reply_to, reply_timeout=REPLY_WAIT_TIMEOUT, priority=priority
+    )
+    if added and messages:
+        # Jonli eventdagi xabarlar nusxasi - worker ularni qayta yuklamaydi (bufer to'la bo'lsa yuklaydi)
+        pending_buffer.put(idempotency_key, messages)
+    return added
+
+def enqueue_source_message(chat_id, message, target_channel_ids, priority=None):
+    """Manba kanaldagi yangi xabarni forward navbatiga qo'yish"""
+    # Reply xabar navbatda parent mapping saqlanguncha (yoki timeout gacha) kutadi
+    enqueue_job(
+        'forward', f"forward:{chat_id}:{message.id}",
+        chat_id, [message.id],
+        messages=[message],
+        reply_to=message.reply_to_msg_id,
+        priority=priority,
+        targets=list(target_channel_ids)
+    )
+    message_store.bump_last_message_id(chat_id, message.id)
+
+def enqueue_source_album(chat_id, grouped_id, messages, target_channel_ids, priority=None):
+    """Albomni bitta ish sifatida navbatga qo'yish"""
+    messages = sorted(messages, key=lambda m: m.id)
+    enqueue_job(
+        'album', f"album:{chat_id}:{grouped_id}",
+        chat_id, [m.id for m in messages],
+        messages=messages,
+        reply_to=messages[0].reply_to_msg_id,
+        priority=priority,
+        targets=list(target_channel_ids)
+    )
+    message_store.bump_last_message_id(chat_id, messages[-1].id)
+
+def enqueue_edit(chat_id, message, priority=None, message_id=None):
+    """Tahrirni debounce bilan navbatga qo'yish: qisqa vaqt ichidagi bir nechta saqlashdan faqat oxirgisi qo'llanadi.
+    message=None bo'lsa worker xabarni Telegram dan o'qiydi"""
+    message_id = message.id if message is not None else message_id
+    key = f"edit:{chat_id}:{message_id}"
+    job_queue.put_debounced(
+        'edit', {'chat_id': chat_id, 'message_ids': [message_id]}, key, EDIT_DEBOUNCE_SECONDS, priority=priority
+    )
+    # Ish hozir bajarilayotgan bo'lsa ham - worker tugagach yangi holatni ko'rib, qayta navbatga qo'yadi
+    if message is not None:
+        pending_buffer.put(key, [message])
+
+async def get_job_messages(job):
+    """Ish uchun xabarlarni olish: avval xotiradan, restart dan keyin esa Telegram dan"""
+    messages = pending_buffer.get(job['key'])
+    if messages is None:
+        payload = job['payload']
+        messages = await client.get_messages(payload['chat_id'], ids=payload['message_ids'])
+        messages = [m for m in messages if m is not None]
+    job['messages'] = messages
+    return messages
+
+def get_reply_mapping(chat_id, message):
+    if not message.reply_to_msg_id:
+        return {}
+    reply_mapping = message_store.get_mapping(chat_id, message.reply_to_msg_id)
+    if not reply_mapping:
+        # Parent sinxronlanmadi - oddiy post sifatida yuborish
+        print(f"Reply mapping for {message.reply_to_msg_id} not found, sending {message.id} as a plain post")
+    return reply_mapping
+
+async def run_forward_job(job):
+    messages = await get_job_messages(job)
+    if not messages:
+        print(f"Source message {job['payload']['message_ids']} no longer exists, skipping")
+        return []
+    message = messages[0]
+    chat_id = job['payload']['chat_id']
+    async with source_message_locks(chat_id, [message.id]):
+        return await forward_message_with_reply(chat_id, message, job['payload']['targets'], get_reply_mapping(chat_id, message))
+
+async def run_album_job(job):
+    messages = await get_job_messages(job)
+    if not messages:
+        print(f"Source album {job['payload']['message_ids']} no longer exists, skipping")
+        return []
+    first_message = min(messages, key=lambda m: m.id)
+    chat_id = job['payload']['chat_id']
+    async with source_message_locks(chat_id, [m.id for m in messages]):
+        return await forward_album(chat_id, messages, job['payload']['targets'], get_reply_mapping(chat_id, first_message))
+
+async def run_edit_job(job):
+    messages = await get_job_messages(job)
+    if not messages:
+        return []
+    return await edit_forwarded_message(job['payload']['chat_id'], messages[0])
+
+async def run_delete_job(job):
+    return await delete_forwarded_messages(job['payload']['chat_id'], job['payload']['message_ids'])
+
+JOB_HANDLERS = {
+    'forward': run_forward_job,
+    'album': run_album_job,
+    'edit': run_edit_job,
+    'delete': run_delete_job,
+}
+
+async def job_worker(worker_id):
+    """Navbatdan ish olib bajaruvchi worker"""
+    while True:
+        job = await job_queue.get()
+        # Navbatda kutish; reply ishlar uchun bu parent mapping ini kutish vaqti ham
+        if job['attempts'] == 1:
+            metrics.observe('reply_wait' if job['reply_to'] else 'queue_wait', time.time() - job['created_at'], kind=job['kind'])
+        started = time.monotonic()
+        # Fan-out slotlari va target tokenlari shu ish prioriteti bo'yicha beriladi
+        current_priority.set(job['priority'])
+        try:
+            failed_targets = await JOB_HANDLERS[job['kind']](job)
+            if failed_targets:
+                raise RuntimeError(f"failed targets: {failed_targets}")
         except Exception as e:
-            print(f"Error processing pending message {msg_id}: {e}")
+            metrics.inc('jobs', kind=job['kind'], result='error')
+            if job['attempts'] >= JOB_MAX_ATTEMPTS:
+                print(f"Job {job['id']} ({job['kind']}) failed permanently after {job['attempts']} attempts: {e}")
+                job_queue.fail(job['id'], e)
+                pending_buffer.pop(job['key'])
+                if job['kind'] in ('forward', 'album'):
+                    # Parent hech qachon yuborilmaydi - unga reply qilganlar kutmasin
+                    for message_id in job['payload']['message_ids']:
+                        job_queue.release_dependents(job['payload']['chat_id'], message_id)
+            else:
+                # Exponential backoff
+                delay = min(JOB_RETRY_BASE_DELAY * 2 ** (job['attempts'] - 1), JOB_RETRY_MAX_DELAY)
+                print(f"Job {job['id']} ({job['kind']}) attempt {job['attempts']} failed: {e}. Retrying in {delay:.0f}s")
+                job_queue.retry(job['id'], e, delay)
+        else:
+            metrics.inc('jobs', kind=job['kind'], result='done')
+            metrics.observe('job', time.monotonic() - started, kind=job['kind'])
+            job_queue.complete(job['id'])
+            latest_messages, update_spilled = pending_buffer.pop(job['key'])
+            if job['kind'] in ('forward', 'album', 'edit'):
+                sent = {id(message) for message in job.get('messages') or []}
+                if latest_messages is not None:
+                    # Ish bajarilayotganda xabar (albom elementi) yana tahrirlandi - eng oxirgi holatni qo'llash
+                    for message in latest_messages:
+                        if id(message) not in sent:
+                            enqueue_edit(job['payload']['chat_id'], message)
+                elif update_spilled:
+                    # Oxirgi tahrir buferga sig'magan - Telegram dan o'qiladi (o'zgarmagan bo'lsa fingerprint tashlaydi)
+                    for message_id in job['payload']['message_ids']:
+                        enqueue_edit(job['payload']['chat_id'], None, message_id=message_id)
 
-async def forward_message_with_reply(event, target_channel_ids, reply_to_msg_id=None):
-    """Xabarni reply bilan forward qilish"""
-    message_map_data = load_message_map()
-    original_message_id = event.id
-    forwarded_message_ids = {}
-    
-    for target_id in target_channel_ids:
+async def retention_loop():
+    """Eski mappinglar va tugagan ishlarni davriy tozalash - baza hajmi kanal yoshiga bog'liq bo'lmaydi"""
+    while True:
         try:
-            target_reply_to_id = None
-            
-            # Reply xabar ID ni topish
-            if reply_to_msg_id:
-                original_reply_map = message_map_data.get(str(reply_to_msg_id))
-                if original_reply_map:
-                    target_reply_to_id = original_reply_map.get(str(target_id))
-                else:
-                    # Agar mapping topilmasa, kutib ko'rish
-                    print(f"Waiting for reply mapping for message {reply_to_msg_id}")
-                    reply_mapping = await wait_for_reply_mapping(reply_to_msg_id)
-                    if reply_mapping:
-                        target_reply_to_id = reply_mapping.get(str(target_id))
-            
-            # Xabarni yuborish
-            forwarded_message = await client.send_message(
-                entity=target_id,
-                message=event.message.text,
-                file=await get_media_for_forward(event.message),
-                reply_to=target_reply_to_id,
-                link_preview=event.message.web_preview if hasattr(event.message, 'web_preview') else None,
-                buttons=event.message.buttons if hasattr(event.message, 'buttons') else None,
-                parse_mode='html'
-            )
-            
-            forwarded_message_ids[str(target_id)] = forwarded_message.id
-            print(f"Forwarded message {original_message_id} to {target_id} as {forwarded_message.id}")
-            
+            pruned = message_store.prune(max_age=MAPPING_RETENTION_DAYS * 86400, max_posts=MAPPING_MAX_POSTS)
+            if pruned:
+                action = "archived" if MAPPING_ARCHIVE_FILE else "dropped"
+                print(f"Retention: {pruned} old message mappings {action}")
+            job_queue.prune(JOB_RETENTION)
         except Exception as e:
-            print(f"Error forwarding message {original_message_id} to {target_id}: {e}")
-    
-    # Mapping ni saqlash
-    if forwarded_message_ids:
-        async with message_processing_lock:
-            message_map_data = load_message_map()
-            message_map_data[str(original_message_id)] = forwarded_message_ids
-            save_message_map(message_map_data)
+            print(f"Retention error: {e}")
+        await asyncio.sleep(RETENTION_INTERVAL)
+
+# --- Startup ---
+
+async def warm_up():
+    """Barcha manba/target entitylarini oldindan yuklash - restart dan keyingi birinchi post kutmaydi"""
+    channel_ids = []
+    for route in channels_config.routes:
+        for channel_id in (route['source'], *route['targets']):
+            if channel_id is not None and channel_id not in channel_ids:
+                channel_ids.append(channel_id)
+
+    async def preload(tg_client, channel_id):
+        # Session bazasidagi snapshot dan (tarmoqsiz); u yerda yo'q bo'lsa - bitta get_entity
+        try:
+            await tg_client.get_input_entity(channel_id)
+        except Exception:
+            try:
+                await tg_client.get_entity(channel_id)
+            except Exception as e:
+                print(f"Warm-up: could not resolve {channel_id}: {e}")
+
+    await asyncio.gather(
+        *(preload(tg_client, channel_id) for tg_client in sender_pool.senders.values() for channel_id in channel_ids),
+        # Kanal nomlari uchun kesh (entity_cache.json) - keshda yo'qlari bitta batched so'rovda
+        resolve_entities(channel_ids)
+    )
+    return len(channel_ids)
+
+# --- Backfill ---
+
+async def enqueue_backfill_batch(chat_id, messages, target_channel_ids):
+    """Backfill xabarlarini tartib bilan navbatga qo'yish (albomlar guruhlanadi)"""
+    # Retention mappinglarini olib tashlagan postlar allaqachon yuborilgan - qayta yuborilmaydi
+    pruned_id = message_store.get_pruned_id(chat_id)
+    album = []
+    for message in messages:
+        # Servis xabarlar (pin, title o'zgarishi va h.k.) nusxalanmaydi
+        if getattr(message, 'action', None) or message.id <= pruned_id:
+            continue
+        if album and album[0].grouped_id != message.grouped_id:
+            enqueue_source_album(chat_id, album[0].grouped_id, album, target_channel_ids, PRIORITY_BACKGROUND)
+            album = []
+        if message.grouped_id:
+            album.append(message)
+        else:
+            enqueue_source_message(chat_id, message, target_channel_ids, PRIORITY_BACKGROUND)
+    if album:
+        enqueue_source_album(chat_id, album[0].grouped_id, album, target_channel_ids, PRIORITY_BACKGROUND)
+
+    # Navbat to'lib ketmasligi uchun workerlar yetib olishini kutish
+    while job_queue.depth() > BACKFILL_MAX_QUEUE_DEPTH:
+        await asyncio.sleep(1)
+
+async def backfill_chat(chat_id, target_channel_ids, limit=None, last_message_ids=None):
+    """Bitta manba chat uchun o'tkazib yuborilgan postlarni navbatga qo'yish.
+
+    limit berilsa - oxirgi limit ta post qayta tekshiriladi (qo'lda backfill).
+    last_message_ids - clientlar ulanishidan oldin olingan watermarklar (ulangandan keyingi jonli postlar ularni suradi).
+    """
+    if limit:
+        # Qo'lda backfill: oxirgi N ta xabar (yangi -> eski keladi, tartibni qaytaramiz)
+        messages = [m async for m in client.iter_messages(chat_id, limit=limit, wait_time=BACKFILL_WAIT_TIME)]
+        messages.reverse()
+        await enqueue_backfill_batch(chat_id, messages, target_channel_ids)
+        return len(messages)
+
+    if last_message_ids is not None:
+        last_message_id = last_message_ids.get(chat_id)
+    else:
+        last_message_id = message_store.get_last_message_id(chat_id)
+    if last_message_id is None:
+        # Birinchi ishga tushish - butun tarixni nusxalamaslik uchun faqat joriy holatni eslab qolamiz
+        latest = await client.get_messages(chat_id, limit=1)
+        if latest:
+            message_store.bump_last_message_id(chat_id, latest[0].id)
+        return 0
+
+    # Oraliqni eski -> yangi tartibda, BACKFILL_BATCH_SIZE lik bo'laklarda oqim bilan o'qish
+    count = 0
+    batch = []
+    async for message in client.iter_messages(chat_id, min_id=last_message_id, reverse=True, wait_time=BACKFILL_WAIT_TIME):
+        batch.append(message)
+        # Albomni ikki bo'lakka bo'lmaslik
+        if len(batch) >= BACKFILL_BATCH_SIZE and not message.grouped_id:
+            await enqueue_backfill_batch(chat_id, batch, target_channel_ids)
+            count += len(batch)
+            batch = []
+    if batch:
+        await enqueue_backfill_batch(chat_id, batch, target_channel_ids)
+        count += len(batch)
+
+    if count:
+        print(f"Backfill: {count} missed messages queued from {chat_id}")
+    return count
+
+async def backfill_source(limit=None, last_message_ids=None):
+    """Barcha manba kanallar uchun backfill (bot o'chiq paytida chiqqan postlar)"""
+    return await single_flight(('backfill', limit), backfill_all_chats, limit, last_message_ids)
+
+async def backfill_all_chats(limit=None, last_message_ids=None):
+    count = 0
+    for chat_id, target_channel_ids in channels_config.targets_by_chat.items():
+        try:
+            count += await backfill_chat(chat_id, target_channel_ids, limit, last_message_ids)
+        except Exception as e:
+            print(f"Backfill error for {chat_id}: {e}")
+    return count
+
+# --- Resync (drift repair) ---
+
+RESYNC_PAGE_SIZE = 100  # get_messages(ids=...) bitta so'rovda 100 tagacha
+
+# Telegram matndan o'zi aniqlaydigan entitylar
+AUTO_ENTITIES = (
+    MessageEntityUrl, MessageEntityMention, MessageEntityHashtag, MessageEntityCashtag,
+    MessageEntityBotCommand, MessageEntityEmail, MessageEntityPhone
+)
+
+def content_parts(text, entities, media):
+    """Drift uchun faqat matn, formatlash va media solishtiriladi (user sessiya tugmalarni nusxalay olmaydi).
+
+    Telegram matndan o'zi aniqlaydigan entitylar (link, mention, hashtag...) hisobga olinmaydi
+    """
+    text = text or ''
+    surrogate_text = add_surrogate(text)
+    formatting = []
+    for entity in entities or []:
+        if isinstance(entity, AUTO_ENTITIES):
+            continue
+        # <a href="url">url</a> - ko'rinadigan link bilan bir xil
+        if isinstance(entity, MessageEntityTextUrl) and \
+                del_surrogate(surrogate_text[entity.offset:entity.offset + entity.length]) == entity.url:
+            continue
+        formatting.append(entity.to_dict())
+    formatting.sort(key=lambda entity: (entity['offset'], entity['length'], entity['_']))
+    return text, json.dumps(formatting, sort_keys=True, default=str), str(media.id) if media else None
+
+async def resync_page(chat_id, messages, target_channel_ids, low_id, high_id, run_id):
+    """Bitta sahifa: manba va target nusxalarini solishtirib, faqat kerakli forward/edit/delete ishlarini navbatga qo'yish"""
+    stats = {'forward': 0, 'edit': 0, 'delete': 0}
+    messages = [m for m in messages if not getattr(m, 'action', None)]
+    by_id = {m.id: m for m in messages}
+    target_set = set(target_channel_ids)
+
+    # Sahifa oralig'idagi barcha mappinglar bitta so'rovda
+    rows = message_store.get_mapping_rows_in_range(chat_id, low_id, high_id)
+
+    # Mapping bor, lekin manbada xabar yo'q - manbada o'chirilgan
+    deleted_ids = sorted({original_id for original_id, *_ in rows if original_id not in by_id})
+    if deleted_ids:
+        enqueue_job(
+            'delete', f"resync:{run_id}:delete:{chat_id}:{low_id}-{high_id}", chat_id, deleted_ids,
+            priority=PRIORITY_BACKGROUND
+        )
+        stats['delete'] = len(deleted_ids)
+
+    # Target nusxalari: har target (va egasi bo'lgan sessiya) uchun 100 talik get_messages
+    copies_by_target = {}
+    mapped = {}
+    for original_id, target_id, forwarded_id, session, _ in rows:
+        if original_id not in by_id or target_id not in target_set:
+            continue
+        copies_by_target.setdefault(target_id, {}).setdefault(session, []).append((original_id, forwarded_id))
+        mapped.setdefault(original_id, set()).add(target_id)
+
+    stale = []
+    drifted = {}
+
+    async def fetch_copies(target_id):
+        first_chunk = True
+        for session, items in copies_by_target[target_id].items():
+            for i in range(0, len(items), RESYNC_PAGE_SIZE):
+                chunk = items[i:i + RESYNC_PAGE_SIZE]
+                # Birinchi so'rov tokenini fanout o'zi oladi, qolganlari (barcha sessiyalar bo'yicha) alohida
+                if not first_chunk:
+                    await fanout.bucket(target_id).acquire()
+                first_chunk = False
+                copies = await sender_pool.get_client(session).get_messages(
+                    target_id, ids=[forwarded_id for _, forwarded_id in chunk]
+                )
+                for (original_id, _), copy in zip(chunk, copies):
+                    if copy is None:
+                        # Nusxa target da qo'lda o'chirilgan - qayta yuboriladi
+                        stale.append((original_id, target_id))
+                        continue
+                    # Target ga aslida yuboriladigan matn bilan solishtiriladi (parse_mode='html' natijasi)
+                    message = by_id[original_id]
+                    expected_text, expected_entities = html.parse(target_text(message, target_id))
+                    expected = content_parts(expected_text, expected_entities, message.photo or message.document)
+                    if content_parts(copy.message, copy.entities, copy.photo or copy.document) != expected:
+                        drifted.setdefault(original_id, {})[target_id] = message_fingerprint(copy)
+
+    # O'qib bo'lmagan target da mavjud mappinglar tegilmaydi (keyingi resync da tekshiriladi)
+    results = await fanout.run(copies_by_target, fetch_copies)
+    for target_id, result in results.items():
+        if isinstance(result, BaseException):
+            print(f"Resync: could not read copies in {target_id}: {result}")
+
+    if stale:
+        message_store.delete_forwarded_ids(chat_id, stale)
+        for original_id, target_id in stale:
+            mapped[original_id].discard(target_id)
+
+    # Target dagi haqiqiy holat fingerprint sifatida yoziladi - edit ishi farqni ko'rib, nusxani tuzatadi
+    for original_id, fingerprints in drifted.items():
+        message_store.set_fingerprints(chat_id, original_id, fingerprints)
+        enqueue_edit(chat_id, by_id[original_id], PRIORITY_BACKGROUND)
+        stats['edit'] += 1
+
+    # Yetishmayotgan nusxalar (albomlar bitta ish sifatida). Retention mappinglarini olib tashlagan postlar
+    # yetishmayotgan emas - ular allaqachon yuborilgan
+    pruned_id = message_store.get_pruned_id(chat_id)
+    albums = {}
+    for message in messages:
+        if message.id <= pruned_id:
+            continue
+        if message.grouped_id:
+            albums.setdefault(message.grouped_id, []).append(message)
+            continue
+        missing = [t for t in target_channel_ids if t not in mapped.get(message.id, ())]
+        if missing:
+            enqueue_job(
+                'forward', f"resync:{run_id}:forward:{chat_id}:{message.id}",
+                chat_id, [message.id],
+                messages=[message],
+                reply_to=message.reply_to_msg_id,
+                priority=PRIORITY_BACKGROUND,
+                targets=missing
+            )
+            stats['forward'] += 1
+    for grouped_id, album in albums.items():
+        album.sort(key=lambda m: m.id)
+        missing = [t for t in target_channel_ids if t not in mapped.get(album[0].id, ())]
+        if missing:
+            enqueue_job(
+                'album', f"resync:{run_id}:album:{chat_id}:{grouped_id}",
+                chat_id, [m.id for m in album],
+                messages=album,
+                reply_to=album[0].reply_to_msg_id,
+                priority=PRIORITY_BACKGROUND,
+                targets=missing
+            )
+            stats['forward'] += 1
+
+    return stats
+
+async def resync_chat(chat_id, target_channel_ids, limit=None, since=None, until=None):
+    """Oxirgi limit ta post yoki [since, until) oralig'ini sahifalab tekshirish (xotira sahifa hajmida qoladi)"""
+    run_id = int(time.time())
+    totals = {'checked': 0, 'forward': 0, 'edit': 0, 'delete': 0}
+    page = []
+    high_id = None
+
+    async def flush():
+        nonlocal high_id
+        low_id = min(m.id for m in page)
+        stats = await resync_page(chat_id, page, target_channel_ids, low_id, high_id or max(m.id for m in page), run_id)
+        for key, value in stats.items():
+            totals[key] += value
+        totals['checked'] += len(page)
+        high_id = low_id - 1
+        page.clear()
+        # Navbat to'lib ketmasligi uchun workerlar yetib olishini kutish
+        while job_queue.depth() > BACKFILL_MAX_QUEUE_DEPTH:
+            await asyncio.sleep(1)
+
+    # Yangi -> eski, iter_messages o'zi 100 talik so'rovlar bilan o'qiydi
+    async for message in client.iter_messages(chat_id, limit=limit, offset_date=until, wait_time=BACKFILL_WAIT_TIME):
+        if since and message.date < since:
+            break
+        # Albomni ikki sahifaga bo'lmaslik
+        if len(page) >= RESYNC_PAGE_SIZE and not (message.grouped_id and message.grouped_id == page[-1].grouped_id):
+            await flush()
+        page.append(message)
+    if page:
+        await flush()
+
+    print(f"Resync {chat_id}: {totals}")
+    return totals
+
+async def resync_source(limit=None, since=None, until=None):
+    """Barcha manba kanallar uchun resync"""
+    return await single_flight(('resync', limit, since, until), resync_all_chats, limit, since, until)
+
+async def resync_all_chats(limit=None, since=None, until=None):
+    totals = {'checked': 0, 'forward': 0, 'edit': 0, 'delete': 0}
+    # Target nusxalarini o'qish ham fon prioritetida - yangi postlar tokenlarni birinchi oladi
+    token = current_priority.set(PRIORITY_BACKGROUND)
+    try:
+        for chat_id, target_channel_ids in channels_config.targets_by_chat.items():
+            try:
+                stats = await resync_chat(chat_id, target_channel_ids, limit=limit, since=since, until=until)
+            except Exception as e:
+                print(f"Resync error for {chat_id}: {e}")
+                continue
+            for key, value in stats.items():
+                totals[key] += value
+    finally:
+        current_priority.reset(token)
+    return totals
 
 # --- Bot Commands ---
 
@@ -214,6 +1098,12 @@ Salom! Men kanallar orasidagi postlarni sinxronlash, tahrirlash va o'chirishni b
 `/add_target` - Maqsad kanal qo'shish  
 `/remove_target` - Maqsad kanalni o'chirish
 `/list_channels` - Sozlangan kanallarni ko'rish
+`/backfill` - Oxirgi postlarni qayta sinxronlash
+`/resync` - Targetlarni manba bilan solishtirib tuzatish
+`/add_route` - Manba -> maqsad marshrut qo'shish
+`/remove_route` - Marshrutni o'chirish
+`/list_routes` - Barcha marshrutlarni ko'rish
+`/stats` - Kechikish va yuborish statistikasi
 
 📝 **Misol:**
 `/set_source @manba_kanal`
@@ -237,9 +1127,7 @@ async def set_source_channel(event):
         # Kanal nomini olish
         channel_name = await get_channel_name(channel_id)
         
-        channels_data = load_channels()
-        channels_data['source_channel'] = channel_id
-        save_channels(channels_data)
+        update_default_route(source=channel_id)
         
         success_msg = f"✅ **Manba kanal muvaffaqiyatli o'rnatildi!**\n\n"
         success_msg += f"📥 **Kanal:** {channel_name}\n"
@@ -266,15 +1154,13 @@ async def add_target_channel(event):
         # Kanal nomini olish
         channel_name = await get_channel_name(channel_id)
         
-        channels_data = load_channels()
-        if channel_id not in channels_data['target_channels']:
-            channels_data['target_channels'].append(channel_id)
-            save_channels(channels_data)
+        if channel_id not in channels_config.target_channels:
+            new_config = update_default_route(targets=[*channels_config.target_channels, channel_id])
             
             success_msg = f"✅ **Maqsad kanal muvaffaqiyatli qo'shildi!**\n\n"
             success_msg += f"📤 **Kanal:** {channel_name}\n"
             success_msg += f"🆔 **ID:** `{channel_id}`\n\n"
-            success_msg += f"📊 **Jami maqsad kanallar:** {len(channels_data['target_channels'])} ta"
+            success_msg += f"📊 **Jami maqsad kanallar:** {len(new_config.target_channels)} ta"
             
             await event.reply(success_msg)
         else:
@@ -298,15 +1184,13 @@ async def remove_target_channel(event):
         # Kanal nomini olish
         channel_name = await get_channel_name(channel_id)
         
-        channels_data = load_channels()
-        if channel_id in channels_data['target_channels']:
-            channels_data['target_channels'].remove(channel_id)
-            save_channels(channels_data)
+        if channel_id in channels_config.target_channels:
+            new_config = update_default_route(targets=[t for t in channels_config.target_channels if t != channel_id])
             
             success_msg = f"✅ **Maqsad kanal muvaffaqiyatli o'chirildi!**\n\n"
             success_msg += f"📤 **Kanal:** {channel_name}\n"
             success_msg += f"🆔 **ID:** `{channel_id}`\n\n"
-            success_msg += f"📊 **Qolgan maqsad kanallar:** {len(channels_data['target_channels'])} ta"
+            success_msg += f"📊 **Qolgan maqsad kanallar:** {len(new_config.target_channels)} ta"
             
             await event.reply(success_msg)
         else:
@@ -316,14 +1200,80 @@ async def remove_target_channel(event):
     except Exception as e:
         await event.reply(f"❌ **Xatolik yuz berdi:**\n`{e}`")
 
+@bot.on(events.NewMessage(pattern='/backfill'))
+async def backfill_command(event):
+    if not event.is_private:
+        return
+    try:
+        parts = event.raw_text.split(' ', 1)
+        limit = int(parts[1].strip()) if len(parts) > 1 else BACKFILL_DEFAULT_LIMIT
+        if limit <= 0:
+            raise ValueError
+        limit = min(limit, BACKFILL_MAX_LIMIT)
+
+        if not channels_config.is_active:
+            await event.reply("🔴 **Kanallar sozlanmagan!**\n\nAvval manba va maqsad kanallarni belgilang.")
+            return
+
+        await event.reply(f"⏳ **Backfill boshlandi...**\n\nOxirgi {limit} ta post tekshirilmoqda.")
+        count = await backfill_source(limit=limit)
+        await event.reply(f"✅ **Backfill yakunlandi!**\n\n📊 {count} ta post navbatga qo'yildi.\nAllaqachon yuborilgan postlar qayta yuborilmaydi.")
+    except ValueError:
+        await event.reply(f"❌ **Noto'g'ri format!**\n\n**Foydalanish:**\n`/backfill 50`\n\nMaksimum: {BACKFILL_MAX_LIMIT} ta post")
+    except Exception as e:
+        await event.reply(f"❌ **Xatolik yuz berdi:**\n`{e}`")
+
+@bot.on(events.NewMessage(pattern='/resync'))
+async def resync_command(event):
+    if not event.is_private:
+        return
+    try:
+        args = event.raw_text.split()[1:]
+        limit = since = until = None
+        if args and '-' in args[0]:
+            # Sana oralig'i: /resync 2024-01-01 [2024-02-01]
+            since = datetime.strptime(args[0], '%Y-%m-%d').replace(tzinfo=timezone.utc)
+            if len(args) > 1:
+                until = datetime.strptime(args[1], '%Y-%m-%d').replace(tzinfo=timezone.utc)
+            period = f"{args[0]} — {args[1] if len(args) > 1 else 'hozir'}"
+        else:
+            limit = int(args[0]) if args else BACKFILL_DEFAULT_LIMIT
+            if limit <= 0:
+                raise ValueError
+            limit = min(limit, RESYNC_MAX_LIMIT)
+            period = f"oxirgi {limit} ta post"
+
+        if not channels_config.targets_by_chat:
+            await event.reply("🔴 **Kanallar sozlanmagan!**\n\nAvval manba va maqsad kanallarni belgilang.")
+            return
+
+        await event.reply(f"⏳ **Resync boshlandi...**\n\n{period} tekshirilmoqda.")
+        totals = await resync_source(limit=limit, since=since, until=until)
+        await event.reply(
+            f"✅ **Resync yakunlandi!**\n\n"
+            f"🔍 Tekshirildi: {totals['checked']} ta post\n"
+            f"📤 Qayta yuboriladi: {totals['forward']}\n"
+            f"✏️ Tahrirlanadi: {totals['edit']}\n"
+            f"🗑 O'chiriladi: {totals['delete']}"
+        )
+    except ValueError:
+        await event.reply(
+            f"❌ **Noto'g'ri format!**\n\n**Foydalanish:**\n`/resync 500`\n`/resync 2024-01-01 2024-02-01`\n\n"
+            f"Maksimum: {RESYNC_MAX_LIMIT} ta post"
+        )
+    except Exception as e:
+        await event.reply(f"❌ **Xatolik yuz berdi:**\n`{e}`")
+
 @bot.on(events.NewMessage(pattern='/list_channels'))
 async def list_channels(event):
     if not event.is_private:
         return
     
-    channels_data = load_channels()
-    source = channels_data['source_channel']
-    targets = channels_data['target_channels']
+    source = channels_config.source_channel
+    targets = channels_config.target_channels
+
+    # Barcha kanallar nomi bitta batched so'rov bilan (keshda bo'lsa - so'rovsiz)
+    entries = await resolve_entities(([source] if source is not None else []) + list(targets))
 
     msg = "📋 **Kanallar Konfiguratsiyasi**\n"
     msg += "═" * 30 + "\n\n"
@@ -333,7 +1283,7 @@ async def list_channels(event):
         msg += "📥 **Manba Kanal:**\n"
         msg += "   ❌ Hech qanday kanal belgilanmagan\n\n"
     else:
-        source_name = await get_channel_name(source)
+        source_name = entity_display_name(entries.get(source), source)
         msg += "📥 **Manba Kanal:**\n"
         msg += f"   ✅ {source_name}\n"
         msg += f"   🆔 `{source}`\n\n"
@@ -344,7 +1294,7 @@ async def list_channels(event):
         msg += "   ❌ Hech qanday kanal qo'shilmagan\n\n"
     else:
         for i, target in enumerate(targets, 1):
-            target_name = await get_channel_name(target)
+            target_name = entity_display_name(entries.get(target), target)
             msg += f"   {i}. ✅ {target_name}\n"
             msg += f"      🆔 `{target}`\n\n"
     
@@ -357,110 +1307,215 @@ async def list_channels(event):
     
     await event.reply(msg)
 
+@bot.on(events.NewMessage(pattern='/add_route'))
+async def add_route(event):
+    if not event.is_private:
+        return
+    try:
+        source_str, target_str = event.raw_text.split()[1:3]
+        source_id = await get_entity_id(source_str)
+        target_id = await get_entity_id(target_str)
+        if source_id is None or target_id is None:
+            await event.reply("❌ **Xatolik!**\n\nKanal topilmadi. ID, username yoki linkni to'g'ri kiriting.")
+            return
+
+        routes = channels_config.to_dict()['routes']
+        route = next((r for r in routes if r['source'] == source_id), None)
+        if route is None:
+            route = {'source': source_id, 'targets': []}
+            routes.append(route)
+        if target_id in route['targets']:
+            await event.reply(f"⚠️ **Diqqat!**\n\nBu marshrut allaqachon mavjud:\n`{source_id}` ➡️ `{target_id}`")
+            return
+        route['targets'].append(target_id)
+        new_config = update_routes(routes)
+
+        names = await resolve_entities([source_id, target_id])
+        success_msg = f"✅ **Marshrut qo'shildi!**\n\n"
+        success_msg += f"📥 {entity_display_name(names.get(source_id), source_id)}\n"
+        success_msg += f"📤 {entity_display_name(names.get(target_id), target_id)}\n\n"
+        success_msg += f"📊 **Jami marshrutlar:** {len(new_config.routes)} ta"
+        await event.reply(success_msg)
+    except ValueError:
+        await event.reply("❌ **Noto'g'ri format!**\n\n**Foydalanish:**\n`/add_route @manba_kanal @maqsad_kanal`")
+    except Exception as e:
+        await event.reply(f"❌ **Xatolik yuz berdi:**\n`{e}`")
+
+@bot.on(events.NewMessage(pattern='/remove_route'))
+async def remove_route(event):
+    if not event.is_private:
+        return
+    try:
+        args = event.raw_text.split()[1:3]
+        if not args:
+            raise ValueError
+        source_id = await get_entity_id(args[0])
+        target_id = await get_entity_id(args[1]) if len(args) > 1 else None
+
+        routes = channels_config.to_dict()['routes']
+        route = next((r for r in routes if r['source'] == source_id), None)
+        if route is None or (target_id is not None and target_id not in route['targets']):
+            await event.reply("⚠️ **Diqqat!**\n\nBunday marshrut mavjud emas.")
+            return
+
+        if target_id is None:
+            # Manba kanalning barcha marshrutlarini o'chirish
+            routes.remove(route)
+        else:
+            route['targets'].remove(target_id)
+        new_config = update_routes(routes)
+        await event.reply(f"✅ **Marshrut o'chirildi!**\n\n📊 **Qolgan marshrutlar:** {len(new_config.routes)} ta")
+    except ValueError:
+        await event.reply("❌ **Noto'g'ri format!**\n\n**Foydalanish:**\n`/remove_route @manba_kanal @maqsad_kanal`\n`/remove_route @manba_kanal` - manbaning barcha marshrutlari")
+    except Exception as e:
+        await event.reply(f"❌ **Xatolik yuz berdi:**\n`{e}`")
+
+@bot.on(events.NewMessage(pattern='/list_routes'))
+async def list_routes(event):
+    if not event.is_private:
+        return
+
+    routes = channels_config.routes
+    if not routes:
+        await event.reply("🔴 **Marshrutlar yo'q**\n\n`/add_route @manba_kanal @maqsad_kanal` bilan qo'shing.")
+        return
+
+    # Barcha kanallar nomi bitta batched so'rov bilan
+    channel_ids = []
+    for route in routes:
+        for channel_id in (route['source'], *route['targets']):
+            if channel_id is not None and channel_id not in channel_ids:
+                channel_ids.append(channel_id)
+    entries = await resolve_entities(channel_ids)
+
+    msg = "🔀 **Marshrutlar Jadvali**\n"
+    msg += "═" * 30 + "\n\n"
+    for i, route in enumerate(routes, 1):
+        source = route['source']
+        source_name = entity_display_name(entries.get(source), source) if source is not None else "❌ Manba yo'q"
+        msg += f"{i}. 📥 {source_name}\n"
+        for target in route['targets']:
+            msg += f"      📤 {entity_display_name(entries.get(target), target)} (`{target}`)\n"
+        msg += "\n"
+    msg += f"📊 **Statistika:** {len(channels_config.targets_by_chat)} ta aktiv manba"
+    await event.reply(msg)
+
+@bot.on(events.NewMessage(pattern='/stats'))
+async def stats_command(event):
+    if not event.is_private:
+        return
+
+    def ms(seconds):
+        return f"{seconds * 1000:.0f}ms"
+
+    msg = "📈 **Statistika**\n"
+    msg += "═" * 30 + "\n\n"
+    msg += f"{'🟢 Tayyor' if bot_ready.is_set() else '🟡 Ishga tushmoqda'}\n"
+    msg += f"📥 Navbatda: **{job_queue.depth()}** ta ish\n"
+    msg += f"🗂 Xotiradagi bufer: **{len(pending_buffer)}**/{pending_buffer.max_size} xabar"
+    if pending_buffer.spilled:
+        msg += f" (to'lganda {pending_buffer.spilled} marta Telegram dan o'qildi)"
+    msg += "\n\n"
+
+    # Bosqichlar bo'yicha p50 / p95 / p99
+    msg += "⏱ **Bosqichlar (p50 / p95 / p99):**\n"
+    stage_lines = 0
+    for stage in ('receive', 'queue_wait', 'reply_wait', 'job', 'store_commit'):
+        for labels, histogram in metrics.histogram_items(stage):
+            q = histogram.quantiles()
+            label = f"{stage} ({labels['kind']})" if 'kind' in labels else stage
+            msg += f"   `{label}`: {ms(q[0.5])} / {ms(q[0.95])} / {ms(q[0.99])} ({histogram.count})\n"
+            stage_lines += 1
+    if not stage_lines:
+        msg += "   Hali ma'lumot yo'q\n"
+
+    # Har bir target: yuborish kechikishi va natijalar - qaysi kanal fan-out ni sekinlatayotgani ko'rinadi
+    results = {}
+    for labels, value in metrics.counter_items('target_sends'):
+        results.setdefault(labels['target'], {})[labels['result']] = value
+    send_latency = {labels['target']: histogram for labels, histogram in metrics.histogram_items('send')}
+    if results:
+        entries = await resolve_entities([int(target) for target in results])
+        msg += "\n📤 **Targetlar:**\n"
+        # Eng sekin target birinchi
+        for target in sorted(results, key=lambda t: -(send_latency[t].quantiles()[0.95] if t in send_latency else 0)):
+            counts = results[target]
+            msg += f"   {entity_display_name(entries.get(int(target)), int(target))}\n"
+            msg += f"      ✅ {counts.get('success', 0)}  ❌ {counts.get('failure', 0)}  ⏳ {counts.get('flood_wait', 0)}"
+            if target in send_latency:
+                q = send_latency[target].quantiles()
+                msg += f"  | p50 {ms(q[0.5])}, p95 {ms(q[0.95])}"
+            msg += "\n"
+
+    await event.reply(msg)
+
 # --- Event Handlers for Message Sync ---
 
 @client.on(events.NewMessage)
 async def handle_new_message(event):
-    channels_data = load_channels()
-    source_channel_id = channels_data['source_channel']
-    target_channel_ids = channels_data['target_channels']
+    # Boshqa chatlardagi eventlar bitta dict lookup bilan tashlanadi (fayl o'qilmaydi)
+    target_channel_ids = channels_config.targets_by_chat.get(event.chat_id)
+    if not target_channel_ids:
+        return
 
-    if source_channel_id is None or not target_channel_ids:
+    # Albom elementlari handle_album da bitta guruh sifatida yuboriladi
+    if event.message.grouped_id:
         return
 
-    # Convert positive ID from JSON to the negative format Telethon uses
-    if isinstance(source_channel_id, int) and source_channel_id > 0:
-        source_channel_id = int(f"-100{source_channel_id}")
+    if is_duplicate_event(event.chat_id, event.id, 'new'):
+        return
 
-    if event.chat_id == source_channel_id:
-        reply_to_msg_id = event.message.reply_to_msg_id
-        
-        # Agar reply xabar bo'lsa va uning mapping i hali yo'q bo'lsa
-        if reply_to_msg_id:
-            message_map_data = load_message_map()
-            if str(reply_to_msg_id) not in message_map_data:
-                # Xabarni pending holatiga qo'yish
-                global pending_messages
-                pending_messages[event.id] = {
-                    'event': event,
-                    'target_channel_ids': target_channel_ids,
-                    'reply_to_msg_id': reply_to_msg_id
-                }
-                print(f"Message {event.id} added to pending queue (waiting for reply mapping)")
-                
-                # 2 soniya kutib, pending xabarlarni qayta ishlash
-                await asyncio.sleep(2)
-                await process_pending_messages()
-                return
-        
-        # Oddiy xabar yoki reply mapping mavjud bo'lsa
-        await forward_message_with_reply(event, target_channel_ids, reply_to_msg_id)
+    # Post chiqqanidan bizga event kelguncha
+    metrics.observe('receive', time.time() - event.message.date.timestamp())
+
+    # block siyosatida bufer to'la bo'lsa - workerlar bo'shatguncha yangi postlar kutadi (kutuvchilar soni ham cheklangan)
+    await pending_buffer.wait_for_space()
+    enqueue_source_message(event.chat_id, event.message, target_channel_ids)
+
+@client.on(events.Album)
+async def handle_album(event):
+    target_channel_ids = channels_config.targets_by_chat.get(event.chat_id)
+    if not target_channel_ids:
+        return
+
+    if is_duplicate_event(event.chat_id, event.grouped_id, 'album'):
+        return
+
+    metrics.observe('receive', time.time() - event.messages[0].date.timestamp())
+    await pending_buffer.wait_for_space()
+    enqueue_source_album(event.chat_id, event.grouped_id, event.messages, target_channel_ids)
 
 @client.on(events.MessageEdited)
 async def handle_edited_message(event):
-    channels_data = load_channels()
-    source_channel_id = channels_data['source_channel']
-    target_channel_ids = channels_data['target_channels']
-
-    if source_channel_id is None or not target_channel_ids:
+    # Boshqa chatlardagi eventlar bitta dict lookup bilan tashlanadi (fayl o'qilmaydi)
+    if event.chat_id not in channels_config.targets_by_chat:
         return
 
-    # Convert positive ID from JSON to the negative format Telethon uses
-    if isinstance(source_channel_id, int) and source_channel_id > 0:
-        source_channel_id = int(f"-100{source_channel_id}")
-
-    if event.chat_id == source_channel_id:
-        async with message_processing_lock:
-            message_map_data = load_message_map()
-            original_message_id = event.id
-
-            if str(original_message_id) in message_map_data:
-                forwarded_ids_map = message_map_data[str(original_message_id)]
-                
-                # Har bir target kanal uchun tahrirlash
-                for target_id_str, forwarded_msg_id in forwarded_ids_map.items():
-                    target_id = int(target_id_str)
-                    try:
-                        # Avval media + caption tahrirlashga harakat qilish
-                        await client.edit_message(
-                            entity=target_id,
-                            message=forwarded_msg_id,
-                            text=event.message.text,
-                            file=await get_media_for_forward(event.message),
-                            link_preview=event.message.web_preview if hasattr(event.message, 'web_preview') else None,
-                            buttons=event.message.buttons if hasattr(event.message, 'buttons') else None,
-                            parse_mode='html'
-                        )
-                        print(f"Edited forwarded message {forwarded_msg_id} in {target_id} for original {original_message_id}")
-                    except Exception as e:
-                        print(f"Error editing message {forwarded_msg_id} in {target_id}: {e}")
-                        # Fallback: Faqat caption tahrirlash
-                        try:
-                            await client.edit_message(
-                                entity=target_id,
-                                message=forwarded_msg_id,
-                                text=event.message.text,
-                                parse_mode='html'
-                            )
-                            print(f"Fallback: Edited caption only for message {forwarded_msg_id}")
-                        except Exception as fallback_error:
-                            print(f"Fallback also failed: {fallback_error}")
+    # edit_date va tarkib o'zgarmagan eventlar (qayta yuborilgan yoki faqat reaksiya/ko'rishlar) - tahrir emas.
+    # edit_date butun soniyada - bir soniya ichidagi ikki saqlash tarkibi bilan farqlanadi
+    edit_date = event.message.edit_date.timestamp() if event.message.edit_date else None
+    if is_duplicate_event(event.chat_id, event.id, 'edit', (edit_date, message_fingerprint(event.message))):
+        return
 
-@client.on(events.MessageDeleted)
-async def handle_deleted_message(event):
-    channels_data = load_channels()
-    source_channel_id = channels_data['source_channel']
-    target_channel_ids = channels_data['target_channels']
+    # Forward/albom ishi hali navbatda (yoki bajarilmoqda) bo'lsa - qolgan targetlarga u yangi matn bilan ketadi
+    forward_key = f"forward:{event.chat_id}:{event.id}"
+    if forward_key in pending_buffer:
+        pending_buffer.put(forward_key, [event.message])
+    elif event.message.grouped_id:
+        album_key = f"album:{event.chat_id}:{event.message.grouped_id}"
+        if album_key in pending_buffer:
+            pending_buffer.replace(album_key, event.message)
 
-    if source_channel_id is None or not target_channel_ids:
+    # Avvalgi urinishda yuborilgan targetlardagi nusxalar (qisman bajarilib, retry kutayotgan ish) ham tahrirlanadi
+    if not message_store.has_mapping(event.chat_id, event.id):
         return
 
-    # Convert positive ID from JSON to the negative format Telethon uses
-    if isinstance(source_channel_id, int) and source_channel_id > 0:
-        source_channel_id = int(f"-100{source_channel_id}")
+    enqueue_edit(event.chat_id, event.message)
 
-    # Check if deletion is from source channel
-    if hasattr(event, 'chat_id') and event.chat_id != source_channel_id:
+@client.on(events.MessageDeleted)
+async def handle_deleted_message(event):
+    # Boshqa chatlardagi eventlar bitta dict lookup bilan tashlanadi (fayl o'qilmaydi)
+    if event.chat_id not in channels_config.targets_by_chat:
         return
 
     # Handle different types of deleted_id (can be int or list)
@@ -473,44 +1528,69 @@ async def handle_deleted_message(event):
         print(f"Unknown deleted_id type: {type(event.deleted_id)}")
         return
 
-    # Process each deleted message
-    for original_message_id in deleted_ids:
-        async with message_processing_lock:
-            message_map_data = load_message_map()
-            if str(original_message_id) in message_map_data:
-                forwarded_ids_map = message_map_data[str(original_message_id)]
-                
-                # Har bir target kanaldan o'chirish
-                for target_id_str, forwarded_msg_id in forwarded_ids_map.items():
-                    target_id = int(target_id_str)
-                    try:
-                        await client.delete_messages(entity=target_id, message_ids=[forwarded_msg_id])
-                        print(f"Deleted forwarded message {forwarded_msg_id} in {target_id} for original {original_message_id}")
-                    except Exception as e:
-                        print(f"Error deleting message {forwarded_msg_id} in {target_id}: {e}")
-                
-                # Mapping dan o'chirish
-                del message_map_data[str(original_message_id)]
-                save_message_map(message_map_data)
-                print(f"Removed message mapping for {original_message_id}")
-            else:
-                print(f"No mapping found for deleted message {original_message_id}")
+    deleted_ids = sorted(deleted_ids)
+    if is_duplicate_event(event.chat_id, tuple(deleted_ids), 'delete'):
+        return
+
+    enqueue_job(
+        'delete', f"delete:{event.chat_id}:{','.join(map(str, deleted_ids))}",
+        event.chat_id, deleted_ids
+    )
 
 async def main():
     print("Bot ishga tushmoqda...")
-    
+
+    # Eski JSON mapping faylini bir marta bazaga ko'chirish
+    imported = message_store.import_json(MESSAGE_MAP_FILE, channels_config.source_chat_id or 0)
+    if imported:
+        print(f"Imported {imported} message mappings from {MESSAGE_MAP_FILE}")
+
+    # Oldingi ishga tushirishda yarim qolgan ishlarni qaytarish
+    recovered = job_queue.recover()
+    if recovered:
+        print(f"Recovered {recovered} unfinished jobs")
+    job_queue.prune(JOB_RETENTION)
+
+    # Watermarklar ulanishdan oldin olinadi: ulanish bilan kelgan jonli postlar MAX() bilan ularni surib,
+    # bot o'chiq paytidagi postlarni backfill dan yashirmasin
+    last_message_ids = {chat_id: message_store.get_last_message_id(chat_id) for chat_id in channels_config.targets_by_chat}
+
     try:
-        # Start the user client (for listening to channel events)
-        print("User client ishga tushmoqda...")
-        await client.start()
-        print("User client ishga tushdi.")
-
-        # Start the bot client
-        print("Bot client ishga tushmoqda...")
-        await bot.start(bot_token=BOT_TOKEN)
+        started = time.monotonic()
+
+        # User client, bot client va sender sessiyalar parallel ishga tushadi
+        print("Clientlar ishga tushmoqda...")
+        await asyncio.gather(
+            client.start(),
+            bot.start(bot_token=BOT_TOKEN),
+            *(sender_pool.get_client(name).start() for name in SENDER_SESSIONS)
+        )
         me = await bot.get_me()
         print(f"Bot client ishga tushdi: @{me.username}")
-        print("Bot tayyor! Kanal xabarlarini kuzatish boshlandi...")
+
+        # Workerlar entitylar yuklangandan keyin boshlaydi; shu orada kelgan eventlar navbatda kutadi
+        warmed = await warm_up()
+        print(f"Warm-up: {warmed} ta kanal yuklandi")
+
+        # Lokal Prometheus endpoint
+        if METRICS_PORT:
+            await metrics.serve(METRICS_HOST, METRICS_PORT)
+            print(f"Metrics: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+
+        # Navbatdagi ishlarni bajaruvchi workerlar
+        workers = [asyncio.create_task(job_worker(i)) for i in range(JOB_WORKERS)]
+        retention_task = asyncio.create_task(retention_loop())
+        print(f"{len(workers)} ta worker ishga tushdi, navbatda {job_queue.depth()} ta ish")
+
+        bot_ready.set()
+        metrics.observe('startup', time.monotonic() - started)
+        print(f"Bot tayyor! ({time.monotonic() - started:.1f}s) Kanal xabarlarini kuzatish boshlandi...")
+
+        # Bot o'chiq paytida o'tkazib yuborilgan postlar
+        try:
+            await backfill_source(last_message_ids=last_message_ids)
+        except Exception as e:
+            print(f"Startup backfill error: {e}")
         
         # Run both clients concurrently using asyncio.gather
         await asyncio.gather(
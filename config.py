@@ -8,3 +8,60 @@ API_ID = int(os.getenv("API_ID"))
 API_HASH = os.getenv("API_HASH")
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 ADMIN_ID = int(os.getenv("ADMIN_ID"))
+
+# Target kanallarga yuborish sozlamalari
+FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", "10"))  # bir vaqtda nechta so'rov
+TARGET_RATE_PER_SEC = float(os.getenv("TARGET_RATE_PER_SEC", "1"))  # har bir target uchun
+TARGET_RATE_BURST = int(os.getenv("TARGET_RATE_BURST", "5"))
+EDIT_DEBOUNCE_SECONDS = float(os.getenv("EDIT_DEBOUNCE_SECONDS", "3"))  # tahrirlar shu jimlikdan keyin qo'llanadi
+DELETE_CHUNK_SIZE = int(os.getenv("DELETE_CHUNK_SIZE", "100"))  # delete_messages bitta so'rovda (Telegram limiti 100)
+
+# Reply xabar parent mapping ini necha soniya kutadi (keyin oddiy post bo'lib ketadi)
+REPLY_WAIT_TIMEOUT = float(os.getenv("REPLY_WAIT_TIMEOUT", "10"))
+
+# Doimiy ish navbati sozlamalari
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "8"))
+JOB_RETRY_BASE_DELAY = float(os.getenv("JOB_RETRY_BASE_DELAY", "2"))  # soniya, har urinishda 2 barobar
+JOB_RETRY_MAX_DELAY = float(os.getenv("JOB_RETRY_MAX_DELAY", "300"))
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", "86400"))  # tugagan ishlar (idempotency kalitlari) necha soniya saqlanadi
+
+# Backfill (bot o'chiq paytida o'tkazib yuborilgan postlar) sozlamalari
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "100"))
+BACKFILL_WAIT_TIME = float(os.getenv("BACKFILL_WAIT_TIME", "1"))  # iter_messages so'rovlari orasidagi pauza
+BACKFILL_MAX_QUEUE_DEPTH = int(os.getenv("BACKFILL_MAX_QUEUE_DEPTH", "200"))
+BACKFILL_DEFAULT_LIMIT = int(os.getenv("BACKFILL_DEFAULT_LIMIT", "50"))  # /backfill buyrug'i uchun
+BACKFILL_MAX_LIMIT = int(os.getenv("BACKFILL_MAX_LIMIT", "1000"))
+
+# Kanal entity keshi
+ENTITY_CACHE_TTL = float(os.getenv("ENTITY_CACHE_TTL", "86400"))  # soniya
+ENTITY_CACHE_MAX_SIZE = int(os.getenv("ENTITY_CACHE_MAX_SIZE", "1000"))
+
+# Qo'shimcha sender sessiyalar (vergul bilan: "sender1,sender2"). Har biri target kanallarda admin bo'lishi
+# va manba kanalga a'zo bo'lishi kerak. Yuk targetlar bo'yicha taqsimlanadi, FloodWait da boshqasiga o'tiladi
+SENDER_SESSIONS = [name.strip() for name in os.getenv("SENDER_SESSIONS", "").split(",") if name.strip()]
+
+# Prometheus formatidagi metrikalar endpointi (0 - o'chirilgan). Faqat lokal interfeysda tinglanadi
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Mapping retention: shundan eski yoki har manba uchun oxirgi N postdan tashqari mappinglar (0 - cheklov yo'q).
+# MAPPING_ARCHIVE_FILE berilsa - o'chirilmaydi, sovuq bazaga ko'chiriladi
+MAPPING_RETENTION_DAYS = float(os.getenv("MAPPING_RETENTION_DAYS", "0"))
+MAPPING_MAX_POSTS = int(os.getenv("MAPPING_MAX_POSTS", "0"))
+MAPPING_ARCHIVE_FILE = os.getenv("MAPPING_ARCHIVE_FILE", "")
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", "3600"))  # soniya
+
+# /resync buyrug'i bir martada tekshiradigan maksimal postlar soni
+RESYNC_MAX_LIMIT = int(os.getenv("RESYNC_MAX_LIMIT", "10000"))
+
+# Qayta kelgan eventlarni tashlash uchun eslab qolinadigan kalitlar soni
+DEDUP_INDEX_SIZE = int(os.getenv("DEDUP_INDEX_SIZE", "10000"))
+
+# Navbatdagi xabarlar nusxalari uchun xotira buferi (xabarlar soni)
+# spill - to'lganda worker xabarni Telegram dan qayta o'qiydi (diskka yozilmaydi: har bir shunday ish uchun
+#         yuklama paytida qo'shimcha get_messages chaqiruv);
+# block - yangi postlar joy bo'shaguncha kutadi. Faqat qabulni kechiktiradi: kutayotgan handlerlar ham
+#         PENDING_BUFFER_SIZE tagacha, undan keyingilari spill kabi qabul qilinadi
+PENDING_BUFFER_SIZE = int(os.getenv("PENDING_BUFFER_SIZE", "1000"))
+PENDING_BUFFER_POLICY = os.getenv("PENDING_BUFFER_POLICY", "spill")
@@ -0,0 +1,24 @@
+from collections import OrderedDict
+
+
+class DedupIndex:
+    """Yaqinda ko'rilgan eventlar kalitlari (LRU, hajmi cheklangan) - qayta kelgan event bitta lookup bilan tashlanadi"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.keys = OrderedDict()
+        self.hits = 0
+
+    def seen(self, key):
+        """Kalit avval ko'rilgan bo'lsa True, aks holda uni eslab qolib False qaytaradi"""
+        if key in self.keys:
+            self.keys.move_to_end(key)
+            self.hits += 1
+            return True
+        self.keys[key] = None
+        if len(self.keys) > self.max_size:
+            self.keys.popitem(last=False)
+        return False
+
+    def __len__(self):
+        return len(self.keys)
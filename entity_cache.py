@@ -0,0 +1,64 @@
+import json
+import os
+import time
+from collections import OrderedDict
+
+
+class EntityCache:
+    """Kanal entity ma'lumotlari (ID, nom, username) uchun TTL + LRU kesh, diskka saqlanadi"""
+
+    def __init__(self, path, ttl, max_size):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.load()
+
+    @staticmethod
+    def _key(key):
+        # Username lar katta-kichik harfga qaramay bitta kalit
+        if isinstance(key, str) and not key.lstrip('-').isdigit():
+            return key.lower().lstrip('@')
+        return str(int(key))
+
+    def get(self, key):
+        key = self._key(key)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry['cached_at'] > self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entity):
+        """Telethon entity dan kerakli maydonlarni keshga yozish"""
+        entry = {
+            'id': entity.id,
+            'title': getattr(entity, 'title', None),
+            'username': getattr(entity, 'username', None),
+            'cached_at': time.time()
+        }
+        for cache_key in {self._key(key), self._key(entity.id)}:
+            self.entries[cache_key] = entry
+            self.entries.move_to_end(cache_key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return entry
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = OrderedDict(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Entity cache could not be loaded: {e}")
+            self.entries = OrderedDict()
+
+    def save(self):
+        tmp_file = self.path + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp_file, self.path)
@@ -0,0 +1,171 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+
+from telethon.errors import FloodWaitError, MessageNotModifiedError
+
+
+# Joriy ish prioriteti (job_worker o'rnatadi) - slot va tokenlar shu tartibda beriladi
+current_priority = contextvars.ContextVar('current_priority', default=0)
+
+
+class PrioritySemaphore:
+    """Bo'shagan slot eng yuqori prioritetli kutuvchiga beriladi, teng prioritetda - kelish tartibida"""
+
+    def __init__(self, value):
+        self.value = value
+        self.waiters = []  # heap: (priority, tartib raqami, future)
+        self.counter = itertools.count()
+
+    async def acquire(self, priority=0):
+        if self.value > 0 and not self.waiters:
+            self.value -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.counter), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Slot berilgandan keyin bekor qilindi - keyingi kutuvchiga o'tkazish
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        while self.waiters:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.value += 1
+
+
+class TokenBucket:
+    """Bitta target kanal uchun token-bucket rate limiter"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        # Target bo'yicha adolatli navbat: yangi postlar fon ishlaridan oldin token oladi
+        self.queue = PrioritySemaphore(1)
+
+    def pause(self, seconds):
+        """FloodWait: server so'ragan vaqtgacha faqat shu target to'xtatiladi"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, priority=None):
+        await self.queue.acquire(current_priority.get() if priority is None else priority)
+        try:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+        finally:
+            self.queue.release()
+
+
+class FanoutEngine:
+    """Bitta amalni barcha target kanallarga parallel yuborish"""
+
+    def __init__(self, concurrency, rate, burst, max_flood_retries=3, metrics=None):
+        self.semaphore = PrioritySemaphore(concurrency)
+        self.metrics = metrics
+        self.rate = rate
+        self.burst = burst
+        self.max_flood_retries = max_flood_retries
+        self.buckets = {}
+
+    def bucket(self, target_id):
+        bucket = self.buckets.get(target_id)
+        if bucket is None:
+            bucket = self.buckets[target_id] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    async def run_one(self, target_id, action, pool=None):
+        bucket = self.bucket(target_id)
+        priority = current_priority.get()
+        for attempt in range(self.max_flood_retries + 1):
+            # Token semaphore dan tashqarida kutiladi - sekin target boshqalarning slotini band qilmaydi
+            await bucket.acquire(priority)
+
+            sender = None
+            if pool is not None:
+                sender = await pool.pick(target_id)
+                if sender is None:
+                    raise RuntimeError(f"No sender session can post to {target_id}")
+                # Barcha sessiyalar FloodWait da - eng tez bo'shaydiganini kutish
+                wait = pool.flood_wait_left(sender, target_id)
+                if wait:
+                    await asyncio.sleep(wait)
+
+            await self.semaphore.acquire(priority)
+            try:
+                if sender is not None:
+                    pool.in_flight[sender] += 1
+                started = time.monotonic()
+                try:
+                    if sender is not None:
+                        result = await action(target_id, sender)
+                    else:
+                        result = await action(target_id)
+                    self._record(target_id, 'success', time.monotonic() - started)
+                    return result
+                except FloodWaitError as e:
+                    self._record(target_id, 'flood_wait')
+                    if attempt == self.max_flood_retries:
+                        self._record(target_id, 'failure')
+                        raise
+                    if sender is not None:
+                        print(f"FloodWait for session {sender} in target {target_id}: {e.seconds}s, switching session")
+                        pool.mark_flood(sender, target_id, e.seconds)
+                        # Boshqa sog'lom sessiya qolmagan - pool siz edit/delete ham shu vaqtgacha to'xtaydi
+                        wait = pool.target_flood_wait(target_id)
+                        if wait:
+                            bucket.pause(wait)
+                    else:
+                        print(f"FloodWait for target {target_id}: pausing {e.seconds}s")
+                        bucket.pause(e.seconds)
+                except MessageNotModifiedError:
+                    # Nusxa allaqachon shu holatda - edit uchun muvaffaqiyat
+                    self._record(target_id, 'success', time.monotonic() - started)
+                    raise
+                except Exception:
+                    self._record(target_id, 'failure')
+                    raise
+                finally:
+                    if sender is not None:
+                        pool.in_flight[sender] -= 1
+            finally:
+                self.semaphore.release()
+
+    def _record(self, target_id, result, seconds=None):
+        if self.metrics is None:
+            return
+        self.metrics.inc('target_sends', target=target_id, result=result)
+        if seconds is not None:
+            self.metrics.observe('send', seconds, target=target_id)
+
+    async def run(self, target_ids, action, pool=None):
+        """{target_id: natija yoki exception} qaytaradi.
+
+        pool berilsa action(target_id, session_name) ko'rinishida chaqiriladi.
+        """
+        target_ids = list(target_ids)
+        results = await asyncio.gather(
+            *(self.run_one(target_id, action, pool) for target_id in target_ids),
+            return_exceptions=True
+        )
+        return dict(zip(target_ids, results))
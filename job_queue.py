@@ -0,0 +1,262 @@
+import asyncio
+import json
+import sqlite3
+import time
+
+# Prioritet klasslari (kichik raqam - oldin bajariladi)
+PRIORITY_NEW = 0
+PRIORITY_DELETE = 1
+PRIORITY_EDIT = 2
+PRIORITY_BACKGROUND = 3  # backfill, resync
+
+KIND_PRIORITY = {
+    'forward': PRIORITY_NEW,
+    'album': PRIORITY_NEW,
+    'delete': PRIORITY_DELETE,
+    'edit': PRIORITY_EDIT,
+}
+
+
+class JobQueue:
+    """Forward/edit/delete ishlari uchun doimiy (SQLite) navbat"""
+
+    def __init__(self, path, background_slots=None):
+        self.path = path
+        # Bir vaqtda nechta fon ishi bajarilishi mumkin - qolgan workerlar yangi postlar uchun bo'sh turadi
+        self.background_slots = background_slots
+        self.running_background = set()
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        with self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    idempotency_key TEXT NOT NULL UNIQUE,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    chat_id INTEGER,
+                    reply_to INTEGER,
+                    reply_deadline REAL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_run_at REAL NOT NULL,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            # Eski baza: reply gating manba chat bo'yicha bo'lishi uchun chat_id ustuni
+            columns = [row[1] for row in self.conn.execute('PRAGMA table_info(jobs)')]
+            if 'chat_id' not in columns:
+                self.conn.execute('ALTER TABLE jobs ADD COLUMN chat_id INTEGER')
+            if 'priority' not in columns:
+                self.conn.execute('ALTER TABLE jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 0')
+                for kind, priority in KIND_PRIORITY.items():
+                    self.conn.execute('UPDATE jobs SET priority = ? WHERE kind = ?', (priority, kind))
+            self.conn.execute('CREATE INDEX IF NOT EXISTS jobs_status_idx ON jobs (status, next_run_at)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS jobs_priority_idx ON jobs (status, priority, id)')
+        self.wakeup = asyncio.Event()
+
+    def put(self, kind, payload, idempotency_key, reply_to=None, reply_timeout=0, priority=None):
+        """Ish qo'shish. Shu kalit bilan ish allaqachon bo'lsa False qaytaradi"""
+        now = time.time()
+        if priority is None:
+            priority = KIND_PRIORITY[kind]
+        with self.conn:
+            cursor = self.conn.execute(
+                '''INSERT OR IGNORE INTO jobs
+                   (idempotency_key, kind, payload, chat_id, reply_to, reply_deadline, priority, next_run_at, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                (idempotency_key, kind, json.dumps(payload), payload.get('chat_id'), reply_to,
+                 now + reply_timeout if reply_to else None, priority, now, now, now)
+            )
+        if cursor.rowcount:
+            self.wake()
+            return True
+        return False
+
+    def put_debounced(self, kind, payload, idempotency_key, delay, priority=None):
+        """Ishni delay soniyadan keyin bajarish. Shu kalitli ish kutayotgan bo'lsa - uning o'rnini egallaydi va vaqti suriladi"""
+        now = time.time()
+        if priority is None:
+            priority = KIND_PRIORITY[kind]
+        with self.conn:
+            # Kutayotgan ish prioriteti faqat oshishi mumkin (jonli tahrir fon ishini tezlashtiradi)
+            cursor = self.conn.execute(
+                '''INSERT INTO jobs (idempotency_key, kind, payload, chat_id, priority, next_run_at, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (idempotency_key) DO UPDATE
+                   SET payload = excluded.payload, next_run_at = excluded.next_run_at, status = 'pending',
+                       priority = CASE WHEN jobs.status = 'pending' THEN MIN(jobs.priority, excluded.priority)
+                                       ELSE excluded.priority END,
+                       attempts = 0, last_error = NULL, updated_at = excluded.updated_at
+                   WHERE jobs.status != 'running' ''',
+                (idempotency_key, kind, json.dumps(payload), payload.get('chat_id'), priority, now + delay, now, now)
+            )
+        if cursor.rowcount:
+            self.wake()
+            return True
+        return False
+
+    def wake(self):
+        self.wakeup.set()
+
+    def _max_priority(self):
+        """Fon ishlari uchun slotlar band bo'lsa - faqat yuqori prioritetli ishlar olinadi"""
+        if self.background_slots is not None and len(self.running_background) >= self.background_slots:
+            return PRIORITY_BACKGROUND - 1
+        return PRIORITY_BACKGROUND
+
+    def claim(self):
+        """Navbatdagi tayyor ishni prioritet bo'yicha olish. Reply ishlar parent mapping saqlanguncha (yoki deadline gacha) kutadi"""
+        now = time.time()
+        row = self.conn.execute(
+            '''SELECT id, idempotency_key, kind, payload, attempts, reply_to, created_at, priority FROM jobs
+               WHERE status = 'pending' AND next_run_at <= ? AND priority <= ?
+                 AND (reply_to IS NULL OR reply_deadline <= ?
+                      OR EXISTS (SELECT 1 FROM message_map
+                                 WHERE source_chat_id = jobs.chat_id AND original_id = jobs.reply_to))
+               ORDER BY priority, id LIMIT 1''',
+            (now, self._max_priority(), now)
+        ).fetchone()
+        if row is None:
+            return None
+
+        job_id, key, kind, payload, attempts, reply_to, created_at, priority = row
+        if priority >= PRIORITY_BACKGROUND:
+            self.running_background.add(job_id)
+        with self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (now, job_id)
+            )
+        return {
+            'id': job_id,
+            'key': key,
+            'kind': kind,
+            'payload': json.loads(payload),
+            'attempts': attempts + 1,
+            'reply_to': reply_to,
+            'created_at': created_at,
+            'priority': priority
+        }
+
+    def _next_wait(self, max_wait=30):
+        row = self.conn.execute(
+            '''SELECT MIN(CASE WHEN reply_to IS NULL THEN next_run_at
+                               ELSE MAX(next_run_at, reply_deadline) END)
+               FROM jobs WHERE status = 'pending' AND priority <= ?''',
+            (self._max_priority(),)
+        ).fetchone()
+        if row[0] is None:
+            return max_wait
+        return min(max(row[0] - time.time(), 0), max_wait)
+
+    async def get(self):
+        while True:
+            job = self.claim()
+            if job:
+                return job
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self._next_wait())
+            except asyncio.TimeoutError:
+                pass
+
+    def _release(self, job_id):
+        if job_id in self.running_background:
+            self.running_background.discard(job_id)
+            # Bo'shagan fon sloti uchun kutayotgan workerlarni uyg'otish
+            self.wake()
+
+    def complete(self, job_id):
+        self._release(job_id)
+        with self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET status = 'done', last_error = NULL, updated_at = ? WHERE id = ?",
+                (time.time(), job_id)
+            )
+
+    def retry(self, job_id, error, delay):
+        self._release(job_id)
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET status = 'pending', next_run_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                (now + delay, str(error), now, job_id)
+            )
+        self.wake()
+
+    def fail(self, job_id, error):
+        self._release(job_id)
+        with self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET status = 'failed', last_error = ?, updated_at = ? WHERE id = ?",
+                (str(error), time.time(), job_id)
+            )
+
+    def release_dependents(self, chat_id, reply_to):
+        """Parent hech qachon sinxronlanmasa - unga reply qilganlarni kutmasdan yuborish"""
+        with self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET reply_deadline = 0 WHERE status = 'pending' AND chat_id = ? AND reply_to = ?",
+                (int(chat_id), int(reply_to))
+            )
+        self.wake()
+
+    def cancel_source_jobs(self, chat_id, message_ids):
+        """O'chirilgan manba xabarlar uchun kutayotgan forward/album/edit ishlarini bekor qilish.
+        Albomdan faqat o'chirilgan elementlar olib tashlanadi. O'zgargan ishlar kalitlarini qaytaradi"""
+        deleted = {int(message_id) for message_id in message_ids}
+        now = time.time()
+        changed = []
+        rows = self.conn.execute(
+            "SELECT id, idempotency_key, payload FROM jobs WHERE status = 'pending' AND chat_id = ? AND kind IN ('forward', 'album', 'edit')",
+            (int(chat_id),)
+        ).fetchall()
+        with self.conn:
+            for job_id, key, payload in rows:
+                payload = json.loads(payload)
+                remaining = [message_id for message_id in payload['message_ids'] if message_id not in deleted]
+                if len(remaining) == len(payload['message_ids']):
+                    continue
+                if remaining:
+                    payload['message_ids'] = remaining
+                    self.conn.execute(
+                        'UPDATE jobs SET payload = ?, updated_at = ? WHERE id = ?', (json.dumps(payload), now, job_id)
+                    )
+                else:
+                    self.conn.execute(
+                        "UPDATE jobs SET status = 'done', last_error = 'source deleted', updated_at = ? WHERE id = ?",
+                        (now, job_id)
+                    )
+                changed.append(key)
+        return changed
+
+    def recover(self):
+        """Restart dan keyin yarim qolgan ishlarni navbatga qaytarish"""
+        with self.conn:
+            cursor = self.conn.execute(
+                "UPDATE jobs SET status = 'pending', updated_at = ? WHERE status = 'running'",
+                (time.time(),)
+            )
+        return cursor.rowcount
+
+    def prune(self, older_than):
+        """Tugagan ishlarni tozalash (idempotency kalitlari older_than soniya saqlanadi)"""
+        with self.conn:
+            cursor = self.conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (time.time() - older_than,)
+            )
+        return cursor.rowcount
+
+    def depth(self):
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'running')"
+        ).fetchone()[0]
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,119 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import contextmanager
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """Oxirgi max_samples ta o'lchovdan p50/p95/p99 hisoblash (xotira cheklangan)"""
+
+    def __init__(self, max_samples):
+        self.samples = deque(maxlen=max_samples)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.sum += value
+
+    def quantiles(self):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: ordered[min(int(q * len(ordered)), len(ordered) - 1)] for q in QUANTILES}
+
+
+class Metrics:
+    """Bosqichlar bo'yicha kechikish va targetlar bo'yicha hisoblagichlar"""
+
+    def __init__(self, prefix='postsentbot', max_samples=1024):
+        self.prefix = prefix
+        self.max_samples = max_samples
+        self.histograms = {}  # (nom, labels) -> Histogram
+        self.counters = {}  # (nom, labels) -> son
+        self.gauges = {}  # nom -> qiymat qaytaruvchi funksiya
+
+    @staticmethod
+    def _labels(labels):
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def observe(self, name, seconds, **labels):
+        key = (name, self._labels(labels))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(self.max_samples)
+        histogram.observe(seconds)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, self._labels(labels))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name, func):
+        self.gauges[name] = func
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - started, **labels)
+
+    def histogram_items(self, name):
+        """[(labels dict, Histogram)] - /stats uchun"""
+        return [(dict(labels), histogram) for (key, labels), histogram in self.histograms.items() if key == name]
+
+    def counter_items(self, name):
+        return [(dict(labels), value) for (key, labels), value in self.counters.items() if key == name]
+
+    def render(self):
+        """Prometheus text formati"""
+        def fmt(labels):
+            return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}' if labels else ''
+
+        lines = []
+        for name in sorted({key for key, _ in self.histograms}):
+            metric = f'{self.prefix}_{name}_seconds'
+            lines.append(f'# TYPE {metric} summary')
+            for (key, labels), histogram in self.histograms.items():
+                if key != name:
+                    continue
+                for q, value in histogram.quantiles().items():
+                    lines.append(f'{metric}{fmt(labels + (("quantile", str(q)),))} {value:.6f}')
+                lines.append(f'{metric}_sum{fmt(labels)} {histogram.sum:.6f}')
+                lines.append(f'{metric}_count{fmt(labels)} {histogram.count}')
+        for name in sorted({key for key, _ in self.counters}):
+            metric = f'{self.prefix}_{name}_total'
+            lines.append(f'# TYPE {metric} counter')
+            for (key, labels), value in self.counters.items():
+                if key == name:
+                    lines.append(f'{metric}{fmt(labels)} {value}')
+        for name, func in sorted(self.gauges.items()):
+            metric = f'{self.prefix}_{name}'
+            lines.append(f'# TYPE {metric} gauge')
+            lines.append(f'{metric} {func()}')
+        return '\n'.join(lines) + '\n'
+
+    async def _handle_http(self, reader, writer):
+        try:
+            # So'rov yo'li muhim emas - har qanday GET metrikalarni qaytaradi
+            await reader.readuntil(b'\r\n\r\n')
+            body = self.render().encode()
+            writer.write(
+                b'HTTP/1.1 200 OK\r\n'
+                b'Content-Type: text/plain; version=0.0.4\r\n'
+                + f'Content-Length: {len(body)}\r\n'.encode()
+                + b'Connection: close\r\n\r\n' + body
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        """Lokal /metrics endpoint (Prometheus scrape uchun)"""
+        return await asyncio.start_server(self._handle_http, host, port)
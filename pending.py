@@ -0,0 +1,115 @@
+import asyncio
+
+
+class PendingMessage:
+    """Yuborish uchun kerakli maydonlargina (Telethon Message obyektining o'rniga navbatda saqlanadi)"""
+    __slots__ = (
+        'id', 'message', 'entities', 'media', 'photo', 'document',
+        'reply_markup', 'web_preview', 'reply_to_msg_id', 'grouped_id'
+    )
+
+    @classmethod
+    def from_message(cls, message):
+        if isinstance(message, cls):
+            return message
+        record = cls()
+        record.id = message.id
+        record.message = message.message
+        record.entities = message.entities
+        record.media = message.media
+        record.photo = message.photo
+        record.document = message.document
+        record.reply_markup = message.reply_markup
+        # send_message faqat mavjudligini tekshiradi - WebPage obyektining o'zi saqlanmaydi
+        record.web_preview = bool(getattr(message, 'web_preview', None))
+        record.reply_to_msg_id = message.reply_to_msg_id
+        record.grouped_id = message.grouped_id
+        return record
+
+    @property
+    def buttons(self):
+        # send_message/edit_message ReplyMarkup ni to'g'ridan-to'g'ri qabul qiladi
+        return self.reply_markup
+
+
+class PendingBuffer:
+    """Navbatdagi ishlar uchun xabarlarning ixcham nusxalari. Hajmi cheklangan:
+
+    spill - bufer to'la bo'lsa nusxa saqlanmaydi, worker xabarni get_messages bilan qayta o'qiydi (ish SQLite navbatida,
+            lekin yuklama paytida har bir shunday ish uchun qo'shimcha API chaqiruv);
+    block - yangi postlar joy bo'shaguncha kutadi. Bu faqat qabulni kechiktiradi: Telethon har bir update uchun baribir
+            task yaratadi, shuning uchun kutayotgan handlerlar ham max_size bilan cheklangan, qolganlari spill kabi qabul qilinadi.
+    """
+
+    def __init__(self, max_size, policy='spill'):
+        if policy not in ('spill', 'block'):
+            raise ValueError(f"Unknown pending buffer policy: {policy}")
+        self.max_size = max_size
+        self.policy = policy
+        self.records = {}  # idempotency key -> [PendingMessage]
+        self.size = 0
+        self.spilled_keys = {}  # buferga sig'magan kalit -> keyingi (tahrir) holati ham sig'madimi
+        self.spilled = 0
+        self.waiting = 0  # block: joy kutayotgan handlerlar
+        self.space = asyncio.Event()
+        self.space.set()
+
+    def __contains__(self, key):
+        return key in self.records or key in self.spilled_keys
+
+    def __len__(self):
+        return self.size
+
+    def put(self, key, messages):
+        """Nusxalarni saqlash (kalit bo'yicha eskisining o'rniga). Sig'masa False"""
+        updated = key in self
+        self._remove(key)
+        records = [PendingMessage.from_message(m) for m in messages]
+        if self.size + len(records) > self.max_size:
+            self.spilled_keys[key] = self.spilled_keys.get(key, False) or updated
+            self.spilled += 1
+            self.space.clear()
+            return False
+        self.spilled_keys.pop(key, None)
+        self.records[key] = records
+        self.size += len(records)
+        if self.size >= self.max_size:
+            self.space.clear()
+        return True
+
+    def replace(self, key, message):
+        """Kalit ostidagi bitta xabarni (masalan albom elementini) yangi holati bilan almashtirish"""
+        records = self.records.get(key)
+        if records is None:
+            if key in self.spilled_keys:
+                self.spilled_keys[key] = True
+            return
+        self.put(key, [message if record.id == message.id else record for record in records])
+
+    def get(self, key):
+        return self.records.get(key)
+
+    def pop(self, key):
+        """(nusxalar yoki None, keyingi holati buferga sig'maganmi) - kalit navbatdan chiqqanda"""
+        records = self._remove(key)
+        return records, self.spilled_keys.pop(key, False)
+
+    def _remove(self, key):
+        records = self.records.pop(key, None)
+        if records:
+            self.size -= len(records)
+            if self.size < self.max_size:
+                self.space.set()
+        return records
+
+    async def wait_for_space(self):
+        """block siyosati: producer joy bo'shaguncha kutadi"""
+        if self.policy != 'block' or self.waiting >= self.max_size:
+            return
+        self.waiting += 1
+        try:
+            while self.size >= self.max_size:
+                self.space.clear()
+                await self.space.wait()
+        finally:
+            self.waiting -= 1
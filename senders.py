@@ -0,0 +1,62 @@
+import time
+
+
+class SenderPool:
+    """Bir nechta user sessiya orasida yuborish yukini taqsimlash"""
+
+    def __init__(self, senders, default_name):
+        self.senders = dict(senders)  # session nomi -> TelegramClient
+        self.default_name = default_name
+        self.in_flight = {name: 0 for name in self.senders}
+        self.flood_until = {}  # (session, target_id) -> monotonic vaqt
+        self.capable = {}  # target_id -> shu targetga post qila oladigan sessiyalar
+
+    def get_client(self, name):
+        """Sessiya nomi bo'yicha client (eski mappinglarda nom yo'q - asosiy sessiya)"""
+        return self.senders.get(name) or self.senders[self.default_name]
+
+    async def _probe(self, target_id):
+        capable = set()
+        for name, tg_client in self.senders.items():
+            # Asosiy sessiya har doim ishlatilgan - u bilan eski xatti-harakat saqlanadi
+            if name == self.default_name:
+                capable.add(name)
+                continue
+            try:
+                permissions = await tg_client.get_permissions(target_id, 'me')
+                if permissions.is_creator or (permissions.is_admin and permissions.post_messages):
+                    capable.add(name)
+            except Exception as e:
+                print(f"Session {name} cannot access {target_id}: {e}")
+        self.capable[target_id] = capable
+
+    async def pick(self, target_id):
+        """Target uchun eng kam yuklangan sog'lom sessiyani tanlash.
+
+        Hammasi FloodWait da bo'lsa - eng tez bo'shaydigani qaytariladi (chaqiruvchi kutadi).
+        """
+        if target_id not in self.capable:
+            await self._probe(target_id)
+        names = self.capable[target_id]
+        if not names:
+            return None
+
+        now = time.monotonic()
+        healthy = [name for name in names if self.flood_until.get((name, target_id), 0) <= now]
+        if not healthy:
+            return min(names, key=lambda name: self.flood_until[(name, target_id)])
+        return min(healthy, key=lambda name: self.in_flight[name])
+
+    def flood_wait_left(self, name, target_id):
+        return max(self.flood_until.get((name, target_id), 0) - time.monotonic(), 0)
+
+    def mark_flood(self, name, target_id, seconds):
+        """FloodWait: shu sessiya shu target uchun vaqtincha ishlatilmaydi, boshqasiga o'tiladi"""
+        self.flood_until[(name, target_id)] = time.monotonic() + seconds
+
+    def target_flood_wait(self, target_id):
+        """Target ga post qila oladigan barcha sessiyalar FloodWait da bo'lsa - eng tez bo'shashigacha qolgan vaqt, aks holda 0"""
+        names = self.capable.get(target_id)
+        if not names:
+            return 0
+        return min(self.flood_wait_left(name, target_id) for name in names)
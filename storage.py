@@ -0,0 +1,284 @@
+import json
+import os
+import sqlite3
+import time
+
+
+class MessageStore:
+    """Xabar mappinglarini SQLite (WAL rejimi) da saqlash. Har bir manba chat o'z nomlar fazosiga ega"""
+
+    def __init__(self, path, legacy_chat_id=0, archive_path=None):
+        self.path = path
+        self.archive_path = archive_path
+        self.conn = sqlite3.connect(path)
+        # WAL - o'qish va yozish bir-birini bloklamaydi, crash dan keyin ham baza butun qoladi
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        if archive_path:
+            # Eski mappinglar uchun "sovuq" baza - asosiy baza kichik va tez qoladi
+            self.conn.execute('ATTACH DATABASE ? AS cold', (archive_path,))
+            self.conn.execute('PRAGMA cold.journal_mode=WAL')
+        with self.conn:
+            columns = [row[1] for row in self.conn.execute('PRAGMA table_info(message_map)')]
+            if columns and 'source_chat_id' not in columns:
+                # Eski baza (bitta manba kanal) - mappinglar legacy_chat_id nomiga ko'chiriladi
+                self.conn.execute('ALTER TABLE message_map RENAME TO message_map_old')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS message_map (
+                    source_chat_id INTEGER NOT NULL,
+                    original_id INTEGER NOT NULL,
+                    target_id INTEGER NOT NULL,
+                    forwarded_id INTEGER NOT NULL,
+                    fingerprint TEXT,
+                    session TEXT,
+                    created_at REAL,
+                    PRIMARY KEY (source_chat_id, original_id, target_id)
+                ) WITHOUT ROWID
+            ''')
+            current_columns = [row[1] for row in self.conn.execute('PRAGMA table_info(message_map)')]
+            # Nusxani qaysi sender sessiya yuborgan - edit/delete ham o'sha sessiya orqali
+            if 'session' not in current_columns:
+                self.conn.execute('ALTER TABLE message_map ADD COLUMN session TEXT')
+            # Retention (TTL) uchun mapping yaratilgan vaqt
+            if 'created_at' not in current_columns:
+                self.conn.execute('ALTER TABLE message_map ADD COLUMN created_at REAL')
+            if columns and 'source_chat_id' not in columns:
+                fingerprint = 'fingerprint' if 'fingerprint' in columns else 'NULL'
+                self.conn.execute(
+                    f'''INSERT INTO message_map (source_chat_id, original_id, target_id, forwarded_id, fingerprint)
+                        SELECT ?, original_id, target_id, forwarded_id, {fingerprint} FROM message_map_old''',
+                    (int(legacy_chat_id or 0),)
+                )
+                self.conn.execute('DROP TABLE message_map_old')
+            # Eski yozuvlarning yoshi noma'lum - TTL migratsiya vaqtidan hisoblanadi
+            self.conn.execute('UPDATE message_map SET created_at = ? WHERE created_at IS NULL', (time.time(),))
+            # Teskari indeks: target dagi nusxadan original xabarni topish
+            self.conn.execute(
+                'CREATE INDEX IF NOT EXISTS message_map_reverse_idx ON message_map (target_id, forwarded_id)'
+            )
+            self.conn.execute('CREATE INDEX IF NOT EXISTS message_map_created_idx ON message_map (created_at)')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS state (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            ''')
+            if archive_path:
+                self.conn.execute('''
+                    CREATE TABLE IF NOT EXISTS cold.message_map (
+                        source_chat_id INTEGER NOT NULL,
+                        original_id INTEGER NOT NULL,
+                        target_id INTEGER NOT NULL,
+                        forwarded_id INTEGER NOT NULL,
+                        fingerprint TEXT,
+                        session TEXT,
+                        created_at REAL,
+                        PRIMARY KEY (source_chat_id, original_id, target_id)
+                    ) WITHOUT ROWID
+                ''')
+                self.conn.execute(
+                    'CREATE INDEX IF NOT EXISTS cold.message_map_reverse_idx ON message_map (target_id, forwarded_id)'
+                )
+
+    def get_mapping(self, chat_id, original_id):
+        """Original xabar uchun {target_id: forwarded_id} mapping ni olish"""
+        rows = self.conn.execute(
+            'SELECT target_id, forwarded_id FROM message_map WHERE source_chat_id = ? AND original_id = ?',
+            (int(chat_id), int(original_id))
+        ).fetchall()
+        return {str(target_id): forwarded_id for target_id, forwarded_id in rows}
+
+    def has_mapping(self, chat_id, original_id):
+        row = self.conn.execute(
+            'SELECT 1 FROM message_map WHERE source_chat_id = ? AND original_id = ? LIMIT 1',
+            (int(chat_id), int(original_id))
+        ).fetchone()
+        return row is not None
+
+    def set_mapping(self, chat_id, original_id, forwarded_ids, fingerprint=None, sessions=None):
+        """Original xabarning barcha target mappinglarini bitta tranzaksiyada upsert qilish"""
+        self.set_mappings(chat_id, {original_id: forwarded_ids}, {original_id: fingerprint}, sessions)
+
+    def set_mappings(self, chat_id, mappings, fingerprints=None, sessions=None):
+        """Bir nechta original xabar mappinglarini ({original_id: {target_id: forwarded_id}}) bitta tranzaksiyada saqlash.
+
+        sessions: {target_id: session nomi} - nusxani yuborgan sessiya
+        """
+        fingerprints = fingerprints or {}
+        sessions = sessions or {}
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                '''INSERT INTO message_map (source_chat_id, original_id, target_id, forwarded_id, fingerprint, session, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (source_chat_id, original_id, target_id) DO UPDATE
+                   SET forwarded_id = excluded.forwarded_id, fingerprint = excluded.fingerprint,
+                       session = excluded.session''',
+                [(int(chat_id), int(original_id), int(target_id), int(forwarded_id),
+                  fingerprints.get(original_id), sessions.get(str(target_id)), now)
+                 for original_id, forwarded_ids in mappings.items()
+                 for target_id, forwarded_id in forwarded_ids.items()]
+            )
+
+    def get_sessions(self, chat_id, original_id):
+        """Har bir target nusxasini yuborgan sessiya: {target_id: session}"""
+        rows = self.conn.execute(
+            'SELECT target_id, session FROM message_map WHERE source_chat_id = ? AND original_id = ?',
+            (int(chat_id), int(original_id))
+        ).fetchall()
+        return {str(target_id): session for target_id, session in rows}
+
+    def get_mapping_rows(self, chat_id, original_ids):
+        """(original_id, target_id, forwarded_id, session) qatorlari - bir nechta xabar uchun bitta so'rovda"""
+        original_ids = [int(original_id) for original_id in original_ids]
+        rows = []
+        for i in range(0, len(original_ids), 500):
+            chunk = original_ids[i:i + 500]
+            rows.extend(self.conn.execute(
+                f'SELECT original_id, target_id, forwarded_id, session FROM message_map '
+                f'WHERE source_chat_id = ? AND original_id IN ({",".join("?" * len(chunk))})',
+                [int(chat_id), *chunk]
+            ).fetchall())
+        return rows
+
+    def get_mapping_rows_in_range(self, chat_id, low_id, high_id):
+        """[low_id, high_id] oralig'idagi mappinglar: (original_id, target_id, forwarded_id, session, fingerprint)"""
+        return self.conn.execute(
+            '''SELECT original_id, target_id, forwarded_id, session, fingerprint FROM message_map
+               WHERE source_chat_id = ? AND original_id BETWEEN ? AND ?''',
+            (int(chat_id), int(low_id), int(high_id))
+        ).fetchall()
+
+    def get_original(self, target_id, forwarded_id):
+        """Teskari qidiruv: target dagi nusxa -> (source_chat_id, original_id). Sovuq bazada ham qidiriladi"""
+        tables = ['message_map'] + (['cold.message_map'] if self.archive_path else [])
+        for table in tables:
+            row = self.conn.execute(
+                f'SELECT source_chat_id, original_id FROM {table} WHERE target_id = ? AND forwarded_id = ? LIMIT 1',
+                (int(target_id), int(forwarded_id))
+            ).fetchone()
+            if row:
+                return row
+        return None
+
+    def get_fingerprints(self, chat_id, original_id):
+        """Har bir target nusxasi uchun saqlangan tarkib fingerprint i: {target_id: fingerprint}"""
+        rows = self.conn.execute(
+            'SELECT target_id, fingerprint FROM message_map WHERE source_chat_id = ? AND original_id = ?',
+            (int(chat_id), int(original_id))
+        ).fetchall()
+        return {str(target_id): fingerprint for target_id, fingerprint in rows}
+
+    def set_fingerprints(self, chat_id, original_id, fingerprints):
+        with self.conn:
+            self.conn.executemany(
+                'UPDATE message_map SET fingerprint = ? WHERE source_chat_id = ? AND original_id = ? AND target_id = ?',
+                [(fingerprint, int(chat_id), int(original_id), int(target_id)) for target_id, fingerprint in fingerprints.items()]
+            )
+
+    def delete_forwarded_ids(self, chat_id, pairs):
+        """(original_id, target_id) juftliklarini bitta tranzaksiyada o'chirish"""
+        with self.conn:
+            self.conn.executemany(
+                'DELETE FROM message_map WHERE source_chat_id = ? AND original_id = ? AND target_id = ?',
+                [(int(chat_id), int(original_id), int(target_id)) for original_id, target_id in pairs]
+            )
+
+    def get_last_message_id(self, chat_id):
+        """Manba chatdan oxirgi qayta ishlangan xabar ID si"""
+        row = self.conn.execute(
+            'SELECT value FROM state WHERE key = ?',
+            (f'last_message_id:{chat_id}',)
+        ).fetchone()
+        return row[0] if row else None
+
+    def bump_last_message_id(self, chat_id, message_id):
+        """Oxirgi xabar ID sini faqat oshirish (hech qachon kamaytirilmaydi)"""
+        with self.conn:
+            self.conn.execute(
+                '''INSERT INTO state (key, value) VALUES (?, ?)
+                   ON CONFLICT (key) DO UPDATE SET value = MAX(value, excluded.value)''',
+                (f'last_message_id:{chat_id}', int(message_id))
+            )
+
+    def get_pruned_id(self, chat_id):
+        """Retention shu ID gacha mappinglarni olib tashlagan - bu oraliqda mapping yo'qligi "yuborilmagan" degani emas"""
+        row = self.conn.execute(
+            'SELECT value FROM state WHERE key = ?',
+            (f'pruned_id:{chat_id}',)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def prune(self, max_age=0, max_posts=0):
+        """Retention: max_age soniyadan eski va har manba chat uchun oxirgi max_posts postdan tashqari mappinglar.
+
+        archive_path berilgan bo'lsa sovuq bazaga ko'chiriladi, aks holda o'chiriladi. 0 - cheklov yo'q.
+        """
+        conditions = []
+        params = []
+        if max_age:
+            conditions.append('created_at < ?')
+            params.append(time.time() - max_age)
+        if max_posts:
+            # Har bir manba chat uchun chegara (max_posts-chi eng yangi post) bir marta hisoblanadi
+            chat_ids = [row[0] for row in self.conn.execute('SELECT DISTINCT source_chat_id FROM message_map')]
+            for chat_id in chat_ids:
+                row = self.conn.execute(
+                    '''SELECT DISTINCT original_id FROM message_map WHERE source_chat_id = ?
+                       ORDER BY original_id DESC LIMIT 1 OFFSET ?''',
+                    (chat_id, int(max_posts) - 1)
+                ).fetchone()
+                if row:
+                    conditions.append('source_chat_id = ? AND original_id < ?')
+                    params.extend((chat_id, row[0]))
+        if not conditions:
+            return 0
+
+        where = ' OR '.join(f'({condition})' for condition in conditions)
+        with self.conn:
+            # Har manba chat uchun olib tashlanayotgan eng katta ID - backfill/resync undan eskilarini qayta yubormaydi
+            self.conn.execute(
+                f'''INSERT INTO state (key, value)
+                    SELECT 'pruned_id:' || source_chat_id, MAX(original_id) FROM message_map
+                    WHERE {where} GROUP BY source_chat_id
+                    ON CONFLICT (key) DO UPDATE SET value = MAX(value, excluded.value)''',
+                params
+            )
+            if self.archive_path:
+                self.conn.execute(
+                    f'''INSERT OR REPLACE INTO cold.message_map
+                        SELECT source_chat_id, original_id, target_id, forwarded_id, fingerprint, session, created_at
+                        FROM message_map WHERE {where}''',
+                    params
+                )
+            cursor = self.conn.execute(f'DELETE FROM message_map WHERE {where}', params)
+        return cursor.rowcount
+
+    def import_json(self, json_path, chat_id):
+        """Eski message_map.json faylini bir marta bazaga ko'chirish"""
+        if not os.path.exists(json_path):
+            return 0
+
+        with open(json_path, 'r', encoding='utf-8') as f:
+            message_map_data = json.load(f)
+
+        rows = []
+        for original_id, forwarded_ids in message_map_data.items():
+            for target_id, forwarded_id in forwarded_ids.items():
+                rows.append((int(chat_id), int(original_id), int(target_id), int(forwarded_id), time.time()))
+
+        # Hammasi bitta tranzaksiyada - yarim yo'lda to'xtasa, qayta import xavfsiz
+        with self.conn:
+            self.conn.executemany(
+                '''INSERT INTO message_map (source_chat_id, original_id, target_id, forwarded_id, created_at)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (source_chat_id, original_id, target_id) DO NOTHING''',
+                rows
+            )
+
+        # Fayl faqat commit dan keyin qayta nomlanadi
+        os.replace(json_path, json_path + '.imported')
+        return len(rows)
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,179 @@
+import copy
+import json
+import re
+from collections import OrderedDict
+
+from telethon.extensions import html
+from telethon.helpers import add_surrogate, del_surrogate
+from telethon.tl.types import MessageEntityHashtag, MessageEntityTextUrl, MessageEntityUrl
+
+REGEX_FLAGS = {'i': re.IGNORECASE, 'm': re.MULTILINE, 's': re.DOTALL}
+
+
+class Variant:
+    """Bitta qoidalar to'plami uchun tayyor natija"""
+    __slots__ = ('text', 'entities', 'html')
+
+    def __init__(self, text, entities):
+        self.text = text
+        self.entities = entities
+        self.html = html.unparse(text, entities)
+
+
+def replace_span(text, entities, start, end, new):
+    """text[start:end] ni new bilan almashtirish va entity offsetlarini moslash (UTF-16 birliklarida)"""
+    delta = len(new) - (end - start)
+    result = []
+    for entity in entities:
+        entity_end = entity.offset + entity.length
+        if entity_end <= start:
+            pass
+        elif entity.offset >= end:
+            entity.offset += delta
+        elif entity.offset == start and entity_end == end:
+            # Aynan shu bo'lak (masalan ko'rinadigan link) - entity yangi matnga moslashadi
+            entity.length = len(new)
+        elif entity.offset <= start and entity_end >= end:
+            entity.length += delta
+        elif entity.offset >= start and entity_end <= end:
+            # Butunlay o'chirilgan bo'lak ichida
+            continue
+        elif entity.offset < start:
+            entity.length = start - entity.offset
+        else:
+            entity.length = entity_end - end
+            entity.offset = start + len(new)
+        if entity.length > 0:
+            result.append(entity)
+    return text[:start] + new + text[end:], result
+
+
+def rstrip_text(text, entities):
+    """Oxiridagi bo'sh joylarni olib tashlash (entitylar matn chegarasida qoladi)"""
+    stripped = text.rstrip()
+    if len(stripped) == len(text):
+        return text, entities
+    entities = [e for e in entities if e.offset < len(stripped)]
+    for entity in entities:
+        entity.length = min(entity.length, len(stripped) - entity.offset)
+    return stripped, entities
+
+
+def compile_replace(rule):
+    pattern = re.compile(rule['pattern'], sum(REGEX_FLAGS[flag] for flag in rule.get('flags', '')))
+    replacement = rule.get('replacement', '')
+
+    def step(text, entities):
+        for match in reversed(list(pattern.finditer(text))):
+            text, entities = replace_span(text, entities, match.start(), match.end(), add_surrogate(match.expand(replacement)))
+        return text, entities
+    return step
+
+
+def compile_link(rule):
+    pattern = re.compile(rule['pattern'])
+    replacement = rule['replacement']
+
+    def step(text, entities):
+        # Yashirin linklar (matn ortidagi URL) - faqat url maydoni
+        for entity in entities:
+            if isinstance(entity, MessageEntityTextUrl):
+                entity.url = pattern.sub(replacement, entity.url)
+        # Ko'rinadigan linklar - matnning o'zi o'zgaradi, oxiridan boshlab
+        for entity in sorted((e for e in entities if isinstance(e, MessageEntityUrl)), key=lambda e: -e.offset):
+            url = text[entity.offset:entity.offset + entity.length]
+            new_url = add_surrogate(pattern.sub(replacement, del_surrogate(url)))
+            if new_url != url:
+                text, entities = replace_span(text, entities, entity.offset, entity.offset + entity.length, new_url)
+        return text, entities
+    return step
+
+
+def compile_strip_hashtags(rule):
+    def step(text, entities):
+        for entity in sorted((e for e in entities if isinstance(e, MessageEntityHashtag)), key=lambda e: -e.offset):
+            start, end = entity.offset, entity.offset + entity.length
+            # Hashtagdan keyingi bitta bo'sh joy ham olib tashlanadi
+            if text[end:end + 1] == ' ':
+                end += 1
+            text, entities = replace_span(text, entities, start, end, '')
+        return text, entities
+    return step
+
+
+def compile_footer(rule):
+    # Footer HTML bir marta parse qilinadi
+    footer_text, footer_entities = html.parse(rule['text'])
+    footer_text = add_surrogate(footer_text)
+    separator = rule.get('separator', '\n\n')
+
+    def step(text, entities):
+        text, entities = rstrip_text(text, entities)
+        offset = len(text) + len(separator)
+        appended = []
+        for entity in footer_entities:
+            entity = copy.copy(entity)
+            entity.offset += offset
+            appended.append(entity)
+        return text + separator + footer_text, entities + appended
+    return step
+
+
+RULE_COMPILERS = {
+    'replace': compile_replace,
+    'link': compile_link,
+    'strip_hashtags': compile_strip_hashtags,
+    'footer': compile_footer,
+}
+
+
+class RuleSet:
+    """Bitta target (yoki bir xil qoidali targetlar) uchun oldindan kompilyatsiya qilingan qoidalar"""
+
+    def __init__(self, rules):
+        self.key = json.dumps(rules, sort_keys=True, ensure_ascii=False)
+        self.steps = []
+        for rule in rules:
+            if rule.get('type') not in RULE_COMPILERS:
+                raise ValueError(f"Unknown transform rule type: {rule.get('type')}")
+            self.steps.append(RULE_COMPILERS[rule['type']](rule))
+
+    def apply(self, text, entities):
+        # Telegram offsetlari UTF-16 birliklarida - butun ish surrogate matn ustida
+        text = add_surrogate(text or '')
+        entities = [copy.copy(entity) for entity in (entities or [])]
+        for step in self.steps:
+            text, entities = step(text, entities)
+
+        # Qoidalardan keyin qolgan chetdagi bo'sh joylar
+        text, entities = rstrip_text(text, entities)
+        return Variant(del_surrogate(text), entities)
+
+
+class Transformer:
+    """Targetlar -> qoidalar. Bir xil qoidalar bitta RuleSet, natijalar (qoidalar, tarkib) bo'yicha keshlanadi"""
+
+    def __init__(self, rules_by_target, cache_size=1024):
+        self.rules_by_target = {str(target): rules for target, rules in (rules_by_target or {}).items() if rules}
+        rulesets = {}
+        self.by_target = {}
+        for target, rules in self.rules_by_target.items():
+            ruleset = RuleSet(rules)
+            self.by_target[target] = rulesets.setdefault(ruleset.key, ruleset)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+
+    def for_target(self, target_id):
+        return self.by_target.get(str(target_id))
+
+    def render(self, ruleset, message, content_key):
+        """content_key - xabar tarkibi fingerprint i: forward, edit va resync bitta natijani qayta ishlatadi"""
+        key = (ruleset.key, content_key)
+        variant = self.cache.get(key)
+        if variant is None:
+            variant = self.cache[key] = ruleset.apply(message.message, message.entities)
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(key)
+        return variant